@@ -0,0 +1,454 @@
+# sherpa-py-janssen is available under the MIT License. https://github.com/Identicum/sherpa-py-janssen/
+# Copyright (c) 2026, Identicum - https://identicum.com/
+#
+# Local stand-in for the Jans Config API and its token endpoint, used by the benchmarks.
+# Objects are kept in memory, so every run starts from an empty server.
+#
+
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+API_PREFIX = '/jans-config-api/api/v1'
+TOKEN_PATH = '/jans-auth/restv1/token'
+WELL_KNOWN_PATHS = ('/.well-known/openid-configuration', '/jans-auth/.well-known/openid-configuration')
+
+############################
+# collections are searched with ?pattern= as a substring of any string property, like Jans does on
+# displayName/description. scripts are read with /inum/{inum}, every other object with /{inum}
+############################
+
+COLLECTIONS = (
+    API_PREFIX + '/attributes',
+    API_PREFIX + '/scopes',
+    API_PREFIX + '/openid/clients',
+    API_PREFIX + '/config/scripts'
+)
+CONFIGS = (
+    API_PREFIX + '/jans-auth-server/config',
+    API_PREFIX + '/api-config',
+    '/jans-config-api/scim/scim-config'
+)
+AGAMA_PATH = API_PREFIX + '/agama-deployment'
+# not part of the Config API: returns every object, configuration and agama project, to verify the end state of a run
+STATE_PATH = '/mock/state'
+
+
+class MockConfigAPI:
+
+    RESPONSE_SHAPES = ('data', 'entries', 'list')
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, latency_jitter=0, error_rate=0, error_status=503,
+                 retry_after=None, capacity=0, response_shape='data', max_page_size=None, agama_deploy_time=0, token_lifetime=300, seed=None):
+        if response_shape not in self.RESPONSE_SHAPES:
+            raise ValueError('response_shape must be one of {}'.format(self.RESPONSE_SHAPES))
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.capacity = capacity
+        self.response_shape = response_shape
+        self.max_page_size = max_page_size
+        self.agama_deploy_time = agama_deploy_time
+        self.token_lifetime = token_lifetime
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset()
+        self.server = ThreadingHTTPServer((host, port), self._build_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def reset(self):
+        with self._lock:
+            self.collections = {path: {} for path in COLLECTIONS}
+            self.configs = {path: {} for path in CONFIGS}
+            self.agama_projects = {}
+            self.tokens = set()
+            self.request_counts = {}
+            self.injected_errors = 0
+            self.in_flight = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='mock-config-api', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def dump_state(self):
+        with self._lock:
+            return {
+                'collections': {path: list(objects.values()) for path, objects in self.collections.items()},
+                'configs': dict(self.configs),
+                'agama': {name: project['configs'] for name, project in self.agama_projects.items()}
+            }
+
+    def request_count(self, method=None):
+        with self._lock:
+            return sum(count for (request_method, _), count in self.request_counts.items() if method is None or request_method == method)
+
+    def _count_request(self, method, path):
+        with self._lock:
+            key = (method, path)
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+    def _enter(self):
+        # requests over capacity are rejected like an overloaded Config API would
+        with self._lock:
+            self.in_flight += 1
+            return not self.capacity or self.in_flight <= self.capacity
+
+    def _exit(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _should_fail(self):
+        with self._lock:
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.injected_errors += 1
+                return True
+            return False
+
+    def _get_latency(self):
+        with self._lock:
+            return self.latency + (self.random.uniform(0, self.latency_jitter) if self.latency_jitter else 0)
+
+    def _build_handler(self):
+        return type('Handler', (MockConfigAPIHandler,), {'mock': self})
+
+############################
+# token endpoint
+############################
+
+    def issue_token(self, scope):
+        acc_token = uuid.uuid4().hex
+        with self._lock:
+            self.tokens.add(acc_token)
+        return {'access_token': acc_token, 'token_type': 'Bearer', 'expires_in': self.token_lifetime, 'scope': scope}
+
+    def is_authorized(self, authorization):
+        if not authorization or not authorization.startswith('Bearer '):
+            return False
+        with self._lock:
+            return authorization[len('Bearer '):] in self.tokens
+
+############################
+# collections
+############################
+
+    def find_collection(self, path):
+        for collection_path in COLLECTIONS:
+            if path == collection_path or path.startswith(collection_path + '/'):
+                return collection_path, [x for x in path[len(collection_path):].split('/') if x]
+        return None, None
+
+    def list_objects(self, collection_path, query):
+        with self._lock:
+            objects = list(self.collections[collection_path].values())
+        pattern = query.get('pattern', [None])[0]
+        if pattern:
+            pattern = pattern.lower()
+            objects = [x for x in objects if any(isinstance(value, str) and pattern in value.lower() for value in x.values())]
+        total_entries = len(objects)
+        start_index = int(query.get('startIndex', [0])[0])
+        limit = int(query.get('limit', [50])[0])
+        if self.max_page_size:
+            limit = min(limit, self.max_page_size)
+        return self.build_list_response(objects[start_index:start_index + limit], total_entries, start_index)
+
+    def build_list_response(self, entries, total_entries, start_index=0):
+        if self.response_shape == 'list':
+            return entries
+        return {'start': start_index, 'totalEntriesCount': total_entries, 'entriesCount': len(entries), self.response_shape: entries}
+
+    def get_object(self, collection_path, inum):
+        with self._lock:
+            return self.collections[collection_path].get(inum)
+
+    def save_object(self, collection_path, json_data, create):
+        json_data = dict(json_data)
+        inum = json_data.get('inum')
+        with self._lock:
+            objects = self.collections[collection_path]
+            if create:
+                if inum in objects:
+                    return 409, {'message': 'inum {} already exists'.format(inum)}
+                if not inum:
+                    inum = json_data['inum'] = uuid.uuid4().hex[:8].upper()
+                if collection_path.endswith('/scopes'):
+                    json_data.setdefault('dn', 'inum={},ou=scopes,o=jans'.format(inum))
+            elif inum not in objects:
+                return 404, {'message': 'inum {} not found'.format(inum)}
+            objects[inum] = json_data
+        return 201 if create else 200, json_data
+
+    def patch_object(self, collection_path, inum, patch_operations):
+        with self._lock:
+            json_data = self.collections[collection_path].get(inum)
+            if json_data is None:
+                return 404, {'message': 'inum {} not found'.format(inum)}
+            json_data = apply_json_patch(json_data, patch_operations)
+            self.collections[collection_path][inum] = json_data
+        return 200, json_data
+
+############################
+# jans modules configuration
+############################
+
+    def get_config(self, path):
+        with self._lock:
+            return self.configs[path]
+
+    def patch_config(self, path, patch_operations):
+        with self._lock:
+            self.configs[path] = apply_json_patch(self.configs[path], patch_operations)
+            return self.configs[path]
+
+############################
+# agama deployments
+############################
+
+    def deploy_agama_project(self, name, zip_size):
+        with self._lock:
+            self.agama_projects[name] = {
+                'id': name,
+                'createdAt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'ready_at': time.monotonic() + self.agama_deploy_time,
+                'details': {'projectMetadata': {'projectName': name}, 'zipSize': zip_size},
+                'configs': {}
+            }
+
+    def get_agama_deployment(self, name):
+        with self._lock:
+            project = self.agama_projects.get(name)
+            if project is None:
+                return None
+            if time.monotonic() < project['ready_at']:
+                return {}
+            deployment = {key: value for key, value in project.items() if key not in ('ready_at', 'configs')}
+            deployment['finishedAt'] = deployment['createdAt']
+            return deployment
+
+    def list_agama_deployments(self, query):
+        with self._lock:
+            names = sorted(self.agama_projects)
+        start = int(query.get('start', [0])[0])
+        count = int(query.get('count', [50])[0])
+        deployments = [self.get_agama_deployment(name) for name in names[start:start + count]]
+        return self.build_list_response([x for x in deployments if x], len(names), start)
+
+    def set_agama_configs(self, name, configs):
+        with self._lock:
+            project = self.agama_projects.get(name)
+            if project is None:
+                return False
+            project['configs'] = configs
+            return True
+
+    def get_agama_configs(self, name):
+        with self._lock:
+            project = self.agama_projects.get(name)
+            return None if project is None else project['configs']
+
+
+############################
+# JSON Patch (add, remove, replace) as applied by Jans
+############################
+
+def apply_json_patch(json_data, patch_operations):
+    json_data = json.loads(json.dumps(json_data))
+    for patch_operation in patch_operations:
+        tokens = [x.replace('~1', '/').replace('~0', '~') for x in patch_operation['path'].split('/')[1:]]
+        parent = json_data
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent.setdefault(token, {})
+        last = tokens[-1]
+        op = patch_operation['op']
+        if isinstance(parent, list):
+            index = len(parent) if last == '-' else int(last)
+            if op == 'add':
+                parent.insert(index, patch_operation['value'])
+            elif op == 'replace':
+                parent[index] = patch_operation['value']
+            elif op == 'remove':
+                del parent[index]
+        elif op in ('add', 'replace'):
+            parent[last] = patch_operation['value']
+        elif op == 'remove':
+            parent.pop(last, None)
+    return json_data
+
+
+class MockConfigAPIHandler(BaseHTTPRequestHandler):
+
+    mock = None
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, Nagle + delayed ACK would add ~40ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/')
+        query = parse_qs(url.query)
+        body = self._read_body()
+        if path == STATE_PATH and method == 'GET':
+            return self._send_json(200, self.mock.dump_state())
+        self.mock._count_request(method, path)
+        if path in WELL_KNOWN_PATHS:
+            return self._send_json(200, {'issuer': self.mock.url, 'token_endpoint': self.mock.url + TOKEN_PATH})
+        if path == TOKEN_PATH and method == 'POST':
+            form = parse_qs(body.decode())
+            return self._send_json(200, self.mock.issue_token(form.get('scope', [''])[0]))
+        if not self.mock.is_authorized(self.headers.get('Authorization')):
+            return self._send_json(401, {'message': 'invalid acc_token'})
+        try:
+            within_capacity = self.mock._enter()
+            latency = self.mock._get_latency()
+            if latency:
+                time.sleep(latency)
+            if not within_capacity or self.mock._should_fail():
+                headers = {} if self.mock.retry_after is None else {'Retry-After': str(self.mock.retry_after)}
+                return self._send_json(self.mock.error_status, {'message': 'injected error'}, headers)
+            try:
+                status, payload = self._route(method, path, query, body)
+            except (ValueError, KeyError, IndexError) as e:
+                status, payload = 400, {'message': str(e)}
+            self._send_json(status, payload)
+        finally:
+            self.mock._exit()
+
+    def _route(self, method, path, query, body):
+        collection_path, segments = self.mock.find_collection(path)
+        if collection_path is not None:
+            return self._route_collection(method, collection_path, segments, query, body)
+        if path in CONFIGS:
+            if method == 'GET':
+                return 200, self.mock.get_config(path)
+            if method == 'PATCH':
+                return 200, self.mock.patch_config(path, json.loads(body))
+        if path == AGAMA_PATH and method == 'GET':
+            return 200, self.mock.list_agama_deployments(query)
+        if path.startswith(AGAMA_PATH + '/configs/'):
+            name = path[len(AGAMA_PATH + '/configs/'):]
+            if method == 'PUT':
+                return (202, {}) if self.mock.set_agama_configs(name, json.loads(body)) else (404, {'message': 'not found'})
+            if method == 'GET':
+                configs = self.mock.get_agama_configs(name)
+                return (404, {'message': 'not found'}) if configs is None else (200, configs)
+        if path.startswith(AGAMA_PATH + '/'):
+            name = path[len(AGAMA_PATH + '/'):]
+            if method == 'POST':
+                self.mock.deploy_agama_project(name, len(body))
+                return 202, None
+            if method == 'GET':
+                deployment = self.mock.get_agama_deployment(name)
+                if deployment is None:
+                    return 404, {'message': 'not found'}
+                return (200, deployment) if deployment else (204, None)
+        return 404, {'message': 'no mock for {} {}'.format(method, path)}
+
+    def _route_collection(self, method, collection_path, segments, query, body):
+        if segments and segments[0] == 'inum':
+            segments = segments[1:]
+        if not segments:
+            if method == 'GET':
+                return 200, self.mock.list_objects(collection_path, query)
+            if method in ('POST', 'PUT'):
+                return self.mock.save_object(collection_path, json.loads(body), method == 'POST')
+        elif len(segments) == 1:
+            if method == 'GET':
+                json_data = self.mock.get_object(collection_path, segments[0])
+                return (404, {'message': 'not found'}) if json_data is None else (200, json_data)
+            if method == 'PATCH':
+                return self.mock.patch_object(collection_path, segments[0], json.loads(body))
+        return 405, {'message': 'method not allowed'}
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                chunk_size = int(self.rfile.readline().split(b';')[0], 16)
+                chunk = self.rfile.read(chunk_size + 2)[:chunk_size]
+                if chunk_size == 0:
+                    break
+                chunks.append(chunk)
+            return b''.join(chunks)
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send_json(self, status, payload, headers={}):
+        content = b'' if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def serve(url_queue=None, **options):
+    mock = MockConfigAPI(**options)
+    if url_queue is not None:
+        url_queue.put(mock.url)
+    try:
+        mock.server.serve_forever()
+    finally:
+        mock.server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Local stand-in for the Jans Config API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0, help='secs added to every Config API response')
+    parser.add_argument('--latency-jitter', type=float, default=0, help='max random secs added on top of --latency')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of Config API requests answered with --error-status')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--retry-after', type=int, default=None)
+    parser.add_argument('--capacity', type=int, default=0, help='concurrent Config API requests served, the rest get --error-status')
+    parser.add_argument('--response-shape', choices=MockConfigAPI.RESPONSE_SHAPES, default='data')
+    parser.add_argument('--max-page-size', type=int, default=None)
+    parser.add_argument('--agama-deploy-time', type=float, default=0)
+    args = parser.parse_args()
+    print('Mock Config API listening on http://{}:{}'.format(args.host, args.port))
+    serve(**{key: value for key, value in vars(args).items()})
@@ -0,0 +1,401 @@
+# sherpa-py-janssen is available under the MIT License. https://github.com/Identicum/sherpa-py-janssen/
+# Copyright (c) 2026, Identicum - https://identicum.com/
+#
+# Measures ConfigAPIClient import throughput, request counts and peak memory against a local mock Config API.
+# Runs offline: python3 benchmarks/run_benchmarks.py --objects 1000,10000 --output bench.json
+# Regressions: python3 benchmarks/run_benchmarks.py --baseline bench.json (fails on request counts, reports throughput and memory)
+#
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_config_api import API_PREFIX, STATE_PATH, apply_json_patch, serve
+from sherpa.janssen.janssen_lib import ConfigAPIClient
+
+############################
+# benchmark modes
+#
+# sequential: one object at a time, one search per object
+# parallel: configapi_max_in_flight objects at a time
+# indexed: parallel, collections listed once instead of one search per object
+# incremental: re-run of an already applied tree, unchanged objects are skipped
+# async: AsyncConfigAPIClient, parallel (requires aiohttp)
+############################
+
+MODES = ('sequential', 'parallel', 'indexed', 'incremental', 'async')
+
+
+class BenchmarkLogger:
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+
+    def _log(self, level, message, *args):
+        if self.verbose:
+            print('{} {}'.format(level, message.format(*args) if args else message))
+
+    def trace(self, message, *args):
+        pass
+
+    def debug(self, message, *args):
+        self._log('DEBUG', message, *args)
+
+    def info(self, message, *args):
+        self._log('INFO', message, *args)
+
+    def warning(self, message, *args):
+        self._log('WARNING', message, *args)
+
+    def error(self, message, *args):
+        self._log('ERROR', message, *args)
+
+
+class BenchmarkProperties(dict):
+
+    def get(self, key):
+        return dict.get(self, key)
+
+############################
+# synthetic customization trees
+#
+# objects are split between attributes, scopes, clients and scripts.
+# attribute and client files use property placeholders, so templating is measured too.
+############################
+
+def generate_customization(folder, objects, agama_projects, seed=0):
+    rnd = random.Random(seed)
+    attributes = int(objects * 0.3)
+    scopes = int(objects * 0.3)
+    scripts = int(objects * 0.1)
+    clients = objects - attributes - scopes - scripts
+    for n in range(attributes):
+        _write_json(folder, 'attributes', 'attr{}'.format(n), {
+            'name': 'benchAttr{}'.format(n),
+            'displayName': 'Bench attribute {}'.format(n),
+            'description': 'Synthetic attribute {}'.format(n),
+            'dataType': 'string',
+            'status': 'active',
+            'origin': 'jansCustomPerson',
+            'claimName': '${bench_claim_prefix}_' + str(n),
+            'viewType': ['admin', 'user'],
+            'editType': ['admin'],
+            'jansMultivaluedAttr': False
+        })
+    for n in range(scopes):
+        _write_json(folder, 'scopes', 'scope{}'.format(n), {
+            'id': 'bench_scope_{}'.format(n),
+            'displayName': 'bench_scope_{}'.format(n),
+            'description': 'Synthetic scope {}'.format(n),
+            'scopeType': 'oauth',
+            'defaultScope': False,
+            'attributes': {'showInConfigurationEndpoint': True}
+        })
+    for n in range(clients):
+        client_scopes = ['bench_scope_{}'.format(rnd.randrange(scopes)) for _ in range(3)] if scopes else []
+        _write_json(folder, 'clients', 'BENCH-CLIENT-{}'.format(n), {
+            'inum': 'BENCH-CLIENT-{}'.format(n),
+            'displayName': 'Bench client {}'.format(n),
+            'clientSecret': '${bench_client_secret}',
+            'redirectUris': ['https://app{}.example.com/callback'.format(n)],
+            'grantTypes': ['authorization_code', 'refresh_token'],
+            'responseTypes': ['code'],
+            'scopes': client_scopes,
+            'attributes': {'runIntrospectionScriptBeforeJwtCreation': False, 'additionalAudience': []}
+        })
+    for n in range(scripts):
+        name = 'BENCH-SCRIPT-{}'.format(n)
+        _write_json(folder, 'script-objects', name, {
+            'inum': name,
+            'name': 'bench_script_{}'.format(n),
+            'scriptType': 'person_authentication',
+            'programmingLanguage': 'python',
+            'level': n % 100,
+            'enabled': True,
+            'moduleProperties': [{'value1': 'usage_type', 'value2': 'interactive'}],
+            'configurationProperties': [{'value1': 'setting{}'.format(x), 'value2': str(x)} for x in range(5)]
+        })
+        with open(os.path.join(folder, 'script-objects', '{}.py'.format(name)), 'w') as code_file:
+            code_file.write('class PersonAuthentication(object):\n' + ''.join('    def step{0}(self):\n        return {0}\n'.format(x) for x in range(20)))
+    for n in range(agama_projects):
+        project_folder = os.path.join(folder, 'agama', 'bench_project_{}'.format(n))
+        os.makedirs(os.path.join(project_folder, 'code'))
+        _write_json(project_folder, '', 'project', {'projectName': 'bench_project_{}'.format(n), 'configs': {'io.jans.bench.main': {'n': n}}})
+        with open(os.path.join(project_folder, 'code', 'io.jans.bench.main.flow'), 'w') as flow_file:
+            flow_file.write('Flow io.jans.bench.main\n    Basepath ""\nFinish true\n' * 50)
+    _write_json(folder, 'jans_auth_server', '01-bench', [
+        {'op': 'replace', 'path': '/loggingLevel', 'value': 'INFO'},
+        {'op': 'add', 'path': '/sessionIdLifetime', 'value': 86400}
+    ])
+    return dict(attributes=attributes, scopes=scopes, clients=clients, scripts=scripts, agama=agama_projects)
+
+
+def _write_json(folder, subfolder, name, json_data):
+    folder = os.path.join(folder, subfolder)
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, '{}.json'.format(name)), 'w') as json_file:
+        json.dump(json_data, json_file, indent=2)
+
+############################
+# runs
+############################
+
+def build_properties(mock_url, state_file, max_in_flight):
+    return BenchmarkProperties(
+        idp_hostname=mock_url,
+        configapi_client_id='bench-client',
+        configapi_client_secret='bench-secret',
+        configapi_max_in_flight=max_in_flight,
+        configapi_state_file=state_file,
+        configapi_agama_poll_interval=0.05,
+        configapi_backoff_factor=0.05,
+        bench_claim_prefix='bench',
+        bench_client_secret='secret'
+    )
+
+
+def import_tree(config_api_client, folder, use_index):
+    config_api_client.prefetch_token()
+    config_api_client.import_attributes(os.path.join(folder, 'attributes'), use_index)
+    config_api_client.import_scopes(os.path.join(folder, 'scopes'), use_index)
+    config_api_client.import_clients(os.path.join(folder, 'clients'), prefetch_scopes=use_index)
+    config_api_client.import_scripts(os.path.join(folder, 'script-objects'))
+    if os.path.isdir(os.path.join(folder, 'agama')):
+        config_api_client.import_agama_scripts(os.path.join(folder, 'agama'), wait_time=60)
+    config_api_client.import_auth_server_config(os.path.join(folder, 'jans_auth_server'))
+
+
+async def import_tree_async(config_api_client, folder, use_index):
+    await config_api_client.prefetch_token()
+    await config_api_client.import_attributes(os.path.join(folder, 'attributes'), use_index)
+    await config_api_client.import_scopes(os.path.join(folder, 'scopes'), use_index)
+    await config_api_client.import_clients(os.path.join(folder, 'clients'), prefetch_scopes=use_index)
+    await config_api_client.import_scripts(os.path.join(folder, 'script-objects'))
+    if os.path.isdir(os.path.join(folder, 'agama')):
+        await config_api_client.import_agama_scripts(os.path.join(folder, 'agama'), wait_time=60)
+    await config_api_client.import_auth_server_config(os.path.join(folder, 'jans_auth_server'))
+
+
+def run_mode(mode, folder, mock_options, max_in_flight, logger):
+    work_folder = tempfile.mkdtemp(prefix='sherpa-janssen-bench-')
+    mock_process, mock_url = start_mock(mock_options)
+    config_api_client = None
+    try:
+        properties = build_properties(mock_url, os.path.join(work_folder, 'state.json'), 1 if mode == 'sequential' else max_in_flight)
+        use_index = mode == 'indexed'
+        if mode == 'async':
+            from sherpa.janssen.async_janssen_lib import AsyncConfigAPIClient
+            config_api_client = AsyncConfigAPIClient(logger, properties)
+            run = lambda: asyncio.run(run_async(config_api_client, folder, use_index))
+        else:
+            config_api_client = ConfigAPIClient(logger, properties, incremental=mode == 'incremental')
+            run = lambda: import_tree(config_api_client, folder, use_index)
+        if mode == 'incremental':
+            # first run applies the tree and records its hashes, the measured run skips everything unchanged
+            run()
+            config_api_client.metrics.reset()
+        result = measure(run, config_api_client)
+        result['mismatches'] = verify_mock_state(mock_url, folder, properties)
+        return result
+    finally:
+        if config_api_client is not None and mode != 'async':
+            config_api_client.close()
+        mock_process.terminate()
+        mock_process.join()
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+
+async def run_async(config_api_client, folder, use_index):
+    async with config_api_client:
+        await import_tree_async(config_api_client, folder, use_index)
+
+
+def measure(run, config_api_client):
+    tracemalloc.start()
+    started_at = time.monotonic()
+    try:
+        run()
+        elapsed = time.monotonic() - started_at
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    report = config_api_client.metrics.report()
+    objects = sum(report['objects'].values())
+    return dict(
+        elapsed=elapsed,
+        objects=objects,
+        objects_per_sec=objects / elapsed if elapsed else 0,
+        requests=report['requests'],
+        retries=sum(x['retries'] for x in report['endpoints'].values()),
+        peak_memory_mb=peak_memory / 1024 / 1024,
+        wire_time=report['wire_time'],
+        cpu_time=report['cpu_time'],
+        results=report['objects']
+    )
+
+
+############################
+# end state
+#
+# after each run the objects, configurations and agama projects on the mock must match the generated tree:
+# one server object per file with every property of the file (placeholders rendered, client scope ids replaced
+# by scope dns, script code loaded), the configuration patches applied and the agama configs set.
+############################
+
+def verify_mock_state(mock_url, folder, properties):
+    with urllib.request.urlopen(mock_url + STATE_PATH) as response:
+        state = json.loads(response.read())
+    collections = state['collections']
+    scope_dns = {x.get('id'): x.get('dn') for x in collections[API_PREFIX + '/scopes']}
+    mismatches = []
+    for subfolder, path, key in (('attributes', '/attributes', 'name'), ('scopes', '/scopes', 'id'),
+                                 ('clients', '/openid/clients', 'inum'), ('script-objects', '/config/scripts', 'inum')):
+        server_objects = collections[API_PREFIX + path]
+        expected_objects = dict(_load_expected_objects(folder, subfolder, properties))
+        if len(server_objects) != len(expected_objects):
+            mismatches.append('{}: {} objects on the mock, {} files'.format(subfolder, len(server_objects), len(expected_objects)))
+        server_index = {x.get(key): x for x in server_objects}
+        for name, expected in expected_objects.items():
+            if subfolder == 'clients' and 'scopes' in expected:
+                expected['scopes'] = [scope_dns.get(x, x) for x in expected.get('scopes') or []]
+            if subfolder == 'script-objects':
+                with open(os.path.join(folder, subfolder, '{}.py'.format(name))) as code_file:
+                    expected['script'] = code_file.read()
+            server_object = server_index.get(expected.get(key))
+            if server_object is None:
+                mismatches.append('{}/{}: missing on the mock'.format(subfolder, name))
+            elif any(server_object.get(x) != value for x, value in expected.items()):
+                mismatches.append('{}/{}: differs on the mock'.format(subfolder, name))
+    expected_config = {}
+    for name, patch_operations in _load_expected_objects(folder, 'jans_auth_server', properties):
+        expected_config = apply_json_patch(expected_config, patch_operations)
+    if state['configs'][API_PREFIX + '/jans-auth-server/config'] != expected_config:
+        mismatches.append('jans_auth_server: configuration differs on the mock')
+    agama_folder = os.path.join(folder, 'agama')
+    for project_name in sorted(os.listdir(agama_folder)) if os.path.isdir(agama_folder) else []:
+        with open(os.path.join(agama_folder, project_name, 'project.json')) as project_file:
+            project_json = json.load(project_file)
+        if state['agama'].get(project_json['projectName']) != project_json['configs']:
+            mismatches.append('agama/{}: not deployed or configs differ on the mock'.format(project_name))
+    return mismatches
+
+
+def _load_expected_objects(folder, subfolder, properties):
+    folder = os.path.join(folder, subfolder)
+    for file_name in sorted(os.listdir(folder)) if os.path.isdir(folder) else []:
+        if file_name.endswith('.json'):
+            with open(os.path.join(folder, file_name)) as json_file:
+                json_text = re.sub(r'\$\{([^}]+)\}', lambda match: str(properties.get(match.group(1))), json_file.read())
+            yield file_name[:-len('.json')], json.loads(json_text)
+
+
+def start_mock(mock_options):
+    # the mock runs in its own process, so it does not compete for the GIL or count in the client peak memory
+    url_queue = multiprocessing.Queue()
+    mock_process = multiprocessing.Process(target=serve, args=(url_queue,), kwargs=mock_options, daemon=True)
+    mock_process.start()
+    return mock_process, url_queue.get(timeout=30)
+
+############################
+# report
+############################
+
+def print_results(results):
+    print('{:>8} {:<12} {:>9} {:>11} {:>9} {:>8} {:>10}'.format('objects', 'mode', 'secs', 'objects/s', 'requests', 'retries', 'peak MB'))
+    for result in results:
+        print('{:>8} {:<12} {:>9.2f} {:>11.1f} {:>9} {:>8} {:>10.1f}'.format(
+            result['size'], result['mode'], result['elapsed'], result['objects_per_sec'], result['requests'], result['retries'], result['peak_memory_mb']))
+
+
+# request counts are deterministic against the mock, so they fail the run; throughput and peak memory depend on
+# the machine and are only reported
+def find_regressions(results, baseline_results, max_regression):
+    baseline = {(x['size'], x['mode']): x for x in baseline_results}
+    regressions = []
+    notes = []
+    for result in results:
+        previous = baseline.get((result['size'], result['mode']))
+        if previous is None:
+            continue
+        if result['requests'] > previous['requests']:
+            regressions.append('{} objects, {}: {} requests, baseline {}'.format(result['size'], result['mode'], result['requests'], previous['requests']))
+        if result['objects_per_sec'] < previous['objects_per_sec'] * (1 - max_regression):
+            notes.append('{} objects, {}: {:.1f} objects/s, baseline {:.1f}'.format(result['size'], result['mode'], result['objects_per_sec'], previous['objects_per_sec']))
+        if result['peak_memory_mb'] > previous['peak_memory_mb'] * (1 + max_regression):
+            notes.append('{} objects, {}: {:.1f} peak MB, baseline {:.1f}'.format(result['size'], result['mode'], result['peak_memory_mb'], previous['peak_memory_mb']))
+    return regressions, notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ConfigAPIClient benchmarks against a local mock Config API')
+    parser.add_argument('--objects', default='1000', help='comma separated tree sizes, e.g. 1000,10000,50000')
+    parser.add_argument('--modes', default=','.join(MODES), help='comma separated modes: {}'.format(', '.join(MODES)))
+    parser.add_argument('--agama-projects', type=int, default=4)
+    parser.add_argument('--max-in-flight', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0, help='secs added by the mock to every Config API response')
+    parser.add_argument('--latency-jitter', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of Config API requests answered with --error-status')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--capacity', type=int, default=0, help='concurrent Config API requests served by the mock, the rest get --error-status')
+    parser.add_argument('--response-shape', choices=('data', 'entries', 'list'), default='data')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON results of a previous run, exit with 1 when request counts grow')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='throughput and memory regression ratio reported against --baseline')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logger = BenchmarkLogger(args.verbose)
+    mock_options = dict(latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+                        error_status=args.error_status, capacity=args.capacity, response_shape=args.response_shape, seed=0)
+    modes = args.modes.split(',')
+    if 'async' in modes:
+        try:
+            import aiohttp
+        except ImportError:
+            print('aiohttp is not installed, skipping async mode')
+            modes.remove('async')
+    results = []
+    for size in [int(x) for x in args.objects.split(',')]:
+        folder = tempfile.mkdtemp(prefix='sherpa-janssen-bench-tree-')
+        try:
+            generate_customization(folder, size, args.agama_projects)
+            for mode in modes:
+                result = run_mode(mode, folder, mock_options, args.max_in_flight, logger)
+                result.update(size=size, mode=mode)
+                results.append(result)
+                print_results([result])
+                for mismatch in result['mismatches']:
+                    print('MISMATCH {} objects, {}: {}'.format(size, mode, mismatch))
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+    print()
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    failed = any(result['mismatches'] for result in results)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions, notes = find_regressions(results, json.load(baseline_file), args.max_regression)
+        for note in notes:
+            print('NOTE {}'.format(note))
+        for regression in regressions:
+            print('REGRESSION {}'.format(regression))
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,13 +8,14 @@ from sherpa.janssen.janssen_lib import ConfigAPIClient
 def main():
     properties = Properties("./local.properties", "./default.properties")
     logger = Logger(os.path.basename(__file__), properties.get("idp_deployment_log_level"), properties.get("idp_deployment_log_file"))
-    run(logger, properties)
+    run(logger, properties, "--full" in sys.argv)
 
 
-def run(logger, properties):
+def run(logger, properties, full=False):
     file_name = os.path.basename(__file__)
     logger.debug("Starting {} deployment".format(file_name))
-    config_api_client = ConfigAPIClient(logger, properties)
+    config_api_client = ConfigAPIClient(logger, properties, incremental=True, full=full)
+    config_api_client.prefetch_token()
 
     config_api_client.import_attributes("./customization/attributes")
     config_api_client.patch_attributes("./customization/attributes/patch")
@@ -28,6 +29,9 @@ def run(logger, properties):
 
     config_api_client.import_auth_server_config("./customization/jans_auth_server")
 
+    config_api_client.metrics.write_report("./deploy-metrics.json")
+    logger.debug("Deployment metrics: {}".format(config_api_client.metrics.to_json()))
+
 
 if __name__ == "__main__":
     sys.exit(main())
@@ -15,6 +15,7 @@ setup(
     author_email='ggallard@identicum.com',
     license='MIT License',
     install_requires=['sherpa-py-utils'],
+    extras_require={'async': ['aiohttp']},
     packages=['sherpa.janssen'],
     zip_safe=False,
     python_requires='>=3.0'
@@ -0,0 +1,559 @@
+# sherpa-py-janssen is available under the MIT License. https://github.com/Identicum/sherpa-py-janssen/
+# Copyright (c) 2024, Identicum - https://identicum.com/
+#
+# Authors:
+#   Ezequiel O Sandoval - esandoval@identicum.com
+#   Gustavo J Gallardo - ggallard@identicum.com
+#
+
+import asyncio
+import json
+import ssl
+import time
+from collections import deque
+from sherpa.janssen.janssen_lib import ConfigAPIClient, ConfigAPIImportError, ImportSummary
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+############################
+# asyncio ConfigAPIClient
+#
+# requires aiohttp: python3 -m pip install "sherpa-py-janssen[async]"
+# public methods mirror ConfigAPIClient as coroutines, use it as: async with AsyncConfigAPIClient(...) as client
+# all requests share one aiohttp session limited to configapi_pool_size connections
+# up to configapi_max_in_flight objects are imported concurrently from the event loop
+# token requests and local file handling (loading objects, zip files) run on the default executor
+############################
+
+class AsyncConfigAPIClient(ConfigAPIClient):
+
+    def __init__(self, logger, properties, verify=True, incremental=False, full=False, detect_drift=False, preparation_cache=None):
+        if aiohttp is None:
+            raise ImportError('AsyncConfigAPIClient requires aiohttp. Install it with: python3 -m pip install "sherpa-py-janssen[async]"')
+        super().__init__(logger, properties, verify, incremental, full, detect_drift, preparation_cache)
+        self.pool_size = max(self._get_property('configapi_pool_size', 10), self.max_in_flight)
+        self.async_session = None
+
+    def _build_ssl(self):
+        if isinstance(self.verify, str):
+            return ssl.create_default_context(cafile=self.verify)
+        return None if self.verify else False
+
+    def _get_async_session(self):
+        if self.async_session is None or self.async_session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size, ssl=self._build_ssl())
+            timeout = aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1])
+            self.async_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self.async_session
+
+    async def aclose(self):
+        if self.async_session is not None:
+            await self.async_session.close()
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def _run_blocking(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    async def _send_limited_request_async(self, operation, endpoint, url, headers, body, is_agama_deploy, stats):
+        waiting_at = time.monotonic()
+        await self.rate_limiter.acquire_async()
+        sent_at = time.monotonic()
+        stats['limiter_wait_time'] += sent_at - waiting_at
+        status = None
+        try:
+            response, content = await self._send_request_async(operation, url, headers, body, is_agama_deploy)
+            status = response.status
+            return response, content
+        finally:
+            wire_time = time.monotonic() - sent_at
+            stats['wire_times'].append(wire_time)
+            self.rate_limiter.release(self.metrics.get_endpoint_template(operation, endpoint), status, wire_time)
+
+    async def _send_request_async(self, operation, url, headers, body, is_agama_deploy=False):
+        session = self._get_async_session()
+        if operation == 'GET':
+            async with session.request(operation, url, headers=headers) as response:
+                return response, await response.read()
+        if is_agama_deploy:
+            with open(body, "rb") as file:
+                async with session.request(operation, url, headers=headers, data=file) as response:
+                    return response, await response.read()
+        async with session.request(operation, url, headers=headers, data=body) as response:
+            return response, await response.read()
+
+    async def _execute_async(self, operation, endpoint, scopes, payload={}):
+        self.logger.debug('{} {}', operation, endpoint)
+        url = '{}{}'.format(self.base_uri, endpoint)
+        is_agama_deploy, content_type, body = self._build_request_body(operation, endpoint, payload)
+        stats = self._new_request_stats()
+        try:
+            response, content = await self._execute_with_retries_async(operation, endpoint, scopes, url, content_type, body, is_agama_deploy, stats)
+        finally:
+            self._record_request(operation, endpoint, body, is_agama_deploy, stats)
+        if response.status >= 400:
+            self.logger.error('Execute Failed - HTTP Code: {}. Response: {}', response.status, content.decode(errors='replace'))
+            response.raise_for_status()
+        payload = {} if operation == 'DELETE' or is_agama_deploy or not content else json.loads(content)
+        self.logger.trace('{} JSON response - {}', operation, payload)
+        return payload
+
+    async def _execute_with_retries_async(self, operation, endpoint, scopes, url, content_type, body, is_agama_deploy, stats):
+        attempt = 0
+        token_refreshed = False
+        while True:
+            self.logger.trace('Getting acc_token for operation')
+            token_started_at = time.monotonic()
+            acc_token = self.token_cache.find_token(scopes)
+            if acc_token is None:
+                acc_token = await self._run_blocking(self.token_cache.get_token, scopes)
+            stats['token_time'] += time.monotonic() - token_started_at
+            headers = {
+                'Authorization': 'Bearer {}'.format(acc_token),
+                'Content-Type': content_type
+            }
+            self.logger.trace('OPERATION: {}, URL: {}, HEADERS: {}, DATA: {}', operation, url, headers, body)
+            try:
+                response, content = await self._send_limited_request_async(operation, endpoint, url, headers, body, is_agama_deploy, stats)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                delay = self._get_error_retry_delay(operation, endpoint, attempt, e, self._is_connect_failure(e))
+                if delay is None:
+                    raise
+                await self._backoff_async(delay, stats)
+                attempt += 1
+                stats['retries'] += 1
+                continue
+            stats['status'] = response.status
+            stats['bytes_received'] += len(content)
+            if response.status == 401 and not token_refreshed:
+                self.logger.debug('acc_token rejected by {}, requesting a new one', endpoint)
+                # invalidate waits for the token cache lock, held by get_token while it requests a token
+                await self._run_blocking(self.token_cache.invalidate, acc_token)
+                token_refreshed = True
+                stats['retries'] += 1
+                continue
+            delay = self._get_response_retry_delay(operation, endpoint, attempt, response.status, response)
+            if delay is not None:
+                await self._backoff_async(delay, stats)
+                attempt += 1
+                stats['retries'] += 1
+                continue
+            return response, content
+
+    def _is_connect_failure(self, error):
+        # aiohttp < 3.10 raises ServerTimeoutError for connect and read timeouts alike, those are not retried on POST/PATCH
+        return isinstance(error, (aiohttp.ClientConnectorError, getattr(aiohttp, 'ConnectionTimeoutError', aiohttp.ClientConnectorError)))
+
+    async def _backoff_async(self, delay, stats):
+        await asyncio.sleep(delay)
+        stats['backoff_time'] += delay
+
+    async def _query_by_pattern_async(self, endpoint, scopes, key, key_val):
+        query_endpoint = '{}?pattern={}'.format(endpoint,key_val)
+        query_list = await self._execute_async('GET', query_endpoint, scopes)
+        return [ x for x in self._get_list_data(query_list) if x.get(key) == key_val]
+
+    async def _list_all_async(self, endpoint, scopes, max_in_flight=1, build_page_endpoint=None):
+        build_page_endpoint = build_page_endpoint or self._build_page_endpoint
+        query_list = await self._execute_async('GET', build_page_endpoint(endpoint, 0), scopes)
+        entries = list(self._get_list_data(query_list))
+        page_starts = self._get_page_starts(query_list, len(entries))
+        if max_in_flight > 1 and page_starts is not None:
+            semaphore = asyncio.Semaphore(max_in_flight)
+
+            async def get_page(start_index):
+                async with semaphore:
+                    return await self._execute_async('GET', build_page_endpoint(endpoint, start_index), scopes)
+
+            for query_list in await asyncio.gather(*[get_page(start_index) for start_index in page_starts]):
+                entries.extend(self._get_list_data(query_list))
+        else:
+            page = entries
+            while self._has_next_page(query_list, len(page), len(entries)):
+                query_list = await self._execute_async('GET', build_page_endpoint(endpoint, len(entries)), scopes)
+                page = self._get_list_data(query_list)
+                entries.extend(page)
+        self.logger.debug('Listed {} entries from {}', len(entries), endpoint)
+        return entries
+
+    async def _build_index_async(self, endpoint, scopes, key):
+        index = {}
+        for entry in await self._list_all_async(endpoint, scopes):
+            index.setdefault(entry.get(key), []).append(entry)
+        return index
+
+    async def _iter_blocking(self, items):
+        # each item is produced on the executor, so loading files does not block the event loop
+        done = object()
+        while True:
+            item = await self._run_blocking(next, items, done)
+            if item is done:
+                return
+            yield item
+
+    async def _iter_pipeline_items(self, items):
+        if isinstance(items, dict):
+            for item in items.items():
+                yield item
+        else:
+            async for item in items:
+                yield item
+
+    async def _run_pipelines_async(self, items, pipeline, max_in_flight=None, summary=None):
+        max_in_flight = self.max_in_flight if max_in_flight is None else max_in_flight
+        summary = ImportSummary() if summary is None else summary
+        if max_in_flight <= 1:
+            try:
+                async for name, item in self._iter_pipeline_items(items):
+                    summary.add(name, await pipeline(name, item))
+            finally:
+                self.metrics.record_summary(summary)
+            return summary
+        self.logger.debug('Processing objects with up to {} in flight', max_in_flight)
+        semaphore = asyncio.Semaphore(max_in_flight)
+
+        async def run_buffered_pipeline(name, item):
+            async with semaphore:
+                with self.logger.buffered() as records:
+                    try:
+                        return await pipeline(name, item), None, records
+                    except Exception as e:
+                        return None, e, records
+
+        async def collect(name, task):
+            result, error, records = await task
+            self.logger.replay(records)
+            if error is None:
+                summary.add(name, result)
+            else:
+                self.logger.error('Processing {} failed: {}', name, error)
+                summary.add_error(name, error)
+
+        # tasks are created as earlier ones complete, so only a window of items is loaded at a time
+        pending = deque()
+        try:
+            async for name, item in self._iter_pipeline_items(items):
+                pending.append((name, asyncio.ensure_future(run_buffered_pipeline(name, item))))
+                if len(pending) >= max_in_flight * 2:
+                    await collect(*pending.popleft())
+        finally:
+            while pending:
+                await collect(*pending.popleft())
+        self.metrics.record_summary(summary)
+        self.logger.debug('Import summary: {}', summary)
+        if summary.errors:
+            raise ConfigAPIImportError(summary)
+        return summary
+
+    async def _import_obj_by_key_async(self, endpoint, scopes, objects_folder, key='name', use_index=False):
+        summary = ImportSummary()
+        changed_objects = await self._get_changed_objects_async(endpoint, scopes, objects_folder, key, summary)
+        has_changes, changed_objects = await self._run_blocking(self._peek, changed_objects)
+        index = await self._build_index_async(endpoint, scopes, key) if use_index and has_changes else None
+        return await self._run_incremental_async(endpoint, changed_objects, lambda name, json_data: self._import_object_by_key_async(endpoint, scopes, name, json_data, key, index), summary)
+
+    async def _import_object_by_key_async(self, endpoint, scopes, name, json_data, key, index):
+        self.logger.debug('Processing object: {}', name)
+        key_val = json_data.get(key)
+        if index is None:
+            search_result_list = await self._query_by_pattern_async(endpoint, scopes, key, key_val)
+        else:
+            search_result_list = index.get(key_val, [])
+        operation, payload = self._plan_import_by_key(key, key_val, json_data, search_result_list)
+        imported = payload
+        if operation is not None:
+            response = await self._execute_async(operation, endpoint, scopes, payload)
+            imported = response if operation == 'POST' else payload
+        if index is not None:
+            index[key_val] = [imported]
+        self._on_object_imported(endpoint, imported)
+        return self.IMPORT_RESULTS[operation]
+
+    async def _import_obj_by_inum_async(self, endpoint, scopes, objects_folder):
+        summary = ImportSummary()
+        if endpoint == '/jans-config-api/api/v1/openid/clients':
+            await self._validate_client_scopes_async(self._iter_objects_to_validate(endpoint, objects_folder))
+        changed_objects = await self._get_changed_objects_async(endpoint, scopes, objects_folder, 'inum', summary)
+        return await self._run_incremental_async(endpoint, changed_objects, lambda name, json_data: self._import_object_by_inum_async(endpoint, scopes, objects_folder, name, json_data), summary)
+
+    async def _get_changed_objects_async(self, endpoint, scopes, objects_folder, key, summary):
+        server_index = None
+        if self.detect_drift and self.incremental and not self.full:
+            # drift checks run on the executor, the collection is listed from the event loop beforehand
+            # (client scope ids were resolved by _validate_client_scopes_async)
+            server_index = await self._build_index_async(endpoint, scopes, key)
+        return self._iter_changed_objects(endpoint, scopes, objects_folder, key, summary, server_index)
+
+    async def _run_incremental_async(self, endpoint, changed_objects, pipeline, summary):
+        async def apply(name, item):
+            json_data, content_hash = item
+            try:
+                result = await pipeline(name, json_data)
+            except Exception:
+                self.state.remove(endpoint, name)
+                raise
+            self.state.set(endpoint, name, content_hash)
+            return result
+        try:
+            return await self._run_pipelines_async(self._iter_blocking(changed_objects), apply, summary=summary)
+        finally:
+            if self.incremental:
+                self.state.save()
+
+    async def _import_object_by_inum_async(self, endpoint, scopes, objects_folder, name, json_data):
+        self.logger.debug('Processing object: {}', name)
+        inum = json_data.get('inum')
+        query_endpoint = self._build_query_endpoint(endpoint, inum)
+        # client scopes were resolved by _validate_client_scopes_async, so this does not query Jans, scripts code is read from disk
+        json_data = await self._run_blocking(self._customize_for_endpoint, endpoint, objects_folder, name, json_data)
+        current_jans_obj = {}
+        try:
+            self.logger.debug('GETting object: {}', query_endpoint)
+            current_jans_obj = await self._execute_async('GET', query_endpoint, scopes)
+        except aiohttp.ClientResponseError:
+            self.logger.debug("Object {} not present in jans", query_endpoint)
+        operation, payload = self._plan_import_by_inum(endpoint, json_data, current_jans_obj)
+        if operation == 'PATCH':
+            await self._execute_async('PATCH', endpoint+"/"+inum, scopes, payload)
+        elif operation == 'POST':
+            await self._execute_async('POST', endpoint, scopes, payload)
+        return self.IMPORT_RESULTS[operation]
+
+    async def _resolve_scope_ids_async(self, scope_ids):
+        unknown_scopes = []
+        for scope_id in self._get_uncached_scope_ids(scope_ids):
+            search_result_list = await self._query_by_pattern_async('/jans-config-api/api/v1/scopes', 'https://jans.io/oauth/config/scopes.readonly', 'id', scope_id)
+            if not self._cache_scope_search(scope_id, search_result_list):
+                unknown_scopes.append(scope_id)
+        return unknown_scopes
+
+    async def _validate_client_scopes_async(self, clients):
+        scope_ids = await self._run_blocking(self._get_client_scope_ids, clients)
+        unknown_scopes = await self._resolve_scope_ids_async(scope_ids)
+        self._check_unknown_scopes(unknown_scopes)
+
+    async def _import_config_async(self, endpoint, scopes, objects_folder):
+        summary = ImportSummary()
+        patches = await self._run_blocking(self._load_objects, objects_folder)
+        if patches:
+            current_config = await self._execute_async('GET', endpoint, scopes)
+            patch_operations = await self._run_blocking(self._plan_config_patch, patches, current_config)
+            if patch_operations:
+                await self._execute_async('PATCH', endpoint, scopes, patch_operations)
+            summary.add(endpoint, self.IMPORT_RESULTS['PATCH' if patch_operations else None])
+        self.metrics.record_summary(summary)
+        return summary
+
+    async def _import_agama_projects_async(self, endpoint, scopes, objects_folder, wait_time, force):
+        self.logger.debug("starting agama project import")
+        folders_objs = self._list_folders_objs(objects_folder)
+        self.logger.trace("folders: {}", folders_objs)
+        try:
+            folders = {folder.name: folder for folder in folders_objs}
+            summary = await self._run_pipelines_async(folders, lambda name, folder: self._import_agama_project_async(endpoint, scopes, folder, wait_time, force), self.agama_max_in_flight)
+        finally:
+            self.state.save()
+        self.logger.debug("Agama projects imported successfully")
+        return summary
+
+    async def _import_agama_project_async(self, endpoint, scopes, folder, wait_time, force):
+        project_json_obj, project_files, content_hash = await self._run_blocking(self._prepare_agama_project, folder)
+        agama_project_name = project_json_obj.get("projectName")
+        if not (force or self.full) and await self._is_agama_project_unchanged_async(endpoint, scopes, agama_project_name, content_hash):
+            self.logger.debug("Agama project {} is unchanged, skipping deployment", agama_project_name)
+            return 'unchanged'
+        zip_file_path = await self._run_blocking(self._get_agama_zip, folder, project_files)
+        self.logger.trace("POST agama project {}", agama_project_name)
+        await self._execute_async('POST', "{}/{}".format(endpoint, agama_project_name), scopes, zip_file_path)
+        await self._wait_agama_deployment_async(endpoint, scopes, agama_project_name, wait_time)
+        self.logger.trace("PUT configs for agama project {}", agama_project_name)
+        configs = project_json_obj.get('configs')
+        await self._execute_async('PUT', "{}/configs/{}".format(endpoint, agama_project_name), scopes, configs)
+        self.state.set('agama', agama_project_name, content_hash)
+        return 'deployed'
+
+    async def _is_agama_project_unchanged_async(self, endpoint, scopes, agama_project_name, content_hash):
+        if self.state.get('agama', agama_project_name) != content_hash:
+            return False
+        try:
+            deployment = await self._execute_async('GET', "{}/{}".format(endpoint, agama_project_name), scopes)
+            return self._is_agama_deployed(agama_project_name, deployment)
+        except Exception as e:
+            self.logger.debug("Agama project {} is not deployed: {}", agama_project_name, e)
+            return False
+
+    async def _wait_agama_deployment_async(self, endpoint, scopes, agama_project_name, wait_time):
+        with self.metrics.phase('agama_waiting'):
+            return await self._poll_agama_deployment_async(endpoint, scopes, agama_project_name, wait_time)
+
+    async def _poll_agama_deployment_async(self, endpoint, scopes, agama_project_name, wait_time):
+        self.logger.trace("Waiting up to {} secs for agama project {} deployment", wait_time, agama_project_name)
+        deadline = time.monotonic() + wait_time
+        delay = self.agama_poll_interval
+        while True:
+            deployment = await self._execute_async('GET', "{}/{}".format(endpoint, agama_project_name), scopes)
+            if self._is_agama_deployed(agama_project_name, deployment):
+                return deployment
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError('Agama project {} was not deployed after {} secs'.format(agama_project_name, wait_time))
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, self.max_backoff)
+
+    async def prefetch_token(self, scopes=ConfigAPIClient.ALL_SCOPES):
+        self.logger.debug('Prefetching acc_token for scopes: {}', scopes)
+        await self._run_blocking(self.token_cache.prefetch, scopes)
+
+    async def warm_scope_cache(self):
+        self.logger.debug('Loading scope ids cache')
+        for scope in await self._list_all_async('/jans-config-api/api/v1/scopes', 'https://jans.io/oauth/config/scopes.readonly'):
+            self._cache_scope_dn(scope)
+
+############################
+# Attribute operations
+############################
+
+    async def import_attributes(self, objects_folder, use_index=False):
+        self.logger.debug('Import attributes from {}', objects_folder)
+        endpoint = '/jans-config-api/api/v1/attributes'
+        scopes = 'https://jans.io/oauth/config/attributes.readonly https://jans.io/oauth/config/attributes.write'
+        return await self._import_obj_by_key_async(endpoint, scopes, objects_folder, use_index=use_index)
+
+############################
+# scopes operations
+############################
+
+    async def get_scope(self, inum):
+        self.logger.debug('Getting scope {}', inum)
+        endpoint = '/jans-config-api/api/v1/scopes/' + inum
+        scopes = 'https://jans.io/oauth/config/scopes.readonly'
+        return await self._execute_async('GET', endpoint, scopes)
+
+    async def import_scopes(self, objects_folder, use_index=False):
+        self.logger.debug('Import scopes from {}', objects_folder)
+        endpoint = '/jans-config-api/api/v1/scopes'
+        scopes = 'https://jans.io/oauth/config/scopes.write https://jans.io/oauth/config/scopes.readonly'
+        return await self._import_obj_by_key_async(endpoint, scopes, objects_folder, 'id', use_index)
+
+############################
+# Client operations
+############################
+
+    async def get_client(self, inum):
+        self.logger.debug('Getting client {}', inum)
+        endpoint = '/jans-config-api/api/v1/openid/clients/' + inum
+        scopes = 'https://jans.io/oauth/config/openid/clients.readonly'
+        return await self._execute_async('GET', endpoint, scopes)
+
+    async def import_clients(self, objects_folder, prefetch_scopes=False):
+        self.logger.debug('Import clients from {}', objects_folder)
+        endpoint = '/jans-config-api/api/v1/openid/clients'
+        scopes = 'https://jans.io/oauth/config/openid/clients.readonly https://jans.io/oauth/config/openid/clients.write'
+        if prefetch_scopes:
+            await self.warm_scope_cache()
+        return await self._import_obj_by_inum_async(endpoint, scopes, objects_folder)
+
+############################
+# Script operations
+############################
+
+    async def import_scripts(self, objects_folder):
+        self.logger.debug('Import Script from {}', objects_folder)
+        endpoint = '/jans-config-api/api/v1/config/scripts'
+        scopes = 'https://jans.io/oauth/config/scripts.readonly https://jans.io/oauth/config/scripts.write'
+        return await self._import_obj_by_inum_async(endpoint, scopes, objects_folder)
+
+############################
+# agama scripts operations
+############################
+
+    async def import_agama_scripts(self, objects_folder, wait_time=300, force=False):
+        self.logger.debug('Import Agama Script from {}', objects_folder)
+        endpoint = '/jans-config-api/api/v1/agama-deployment'
+        scopes = 'https://jans.io/oauth/config/agama.readonly https://jans.io/oauth/config/agama.write https://jans.io/oauth/config/agama.delete'
+        return await self._import_agama_projects_async(endpoint, scopes, objects_folder, wait_time, force)
+
+############################
+# jans modules configuration
+############################
+
+    async def get_auth_server_config(self):
+        self.logger.debug('Getting auth-server config')
+        endpoint = '/jans-config-api/api/v1/jans-auth-server/config'
+        scopes = 'https://jans.io/oauth/jans-auth-server/config/properties.readonly'
+        return await self._execute_async('GET', endpoint, scopes)
+
+    async def import_auth_server_config(self, objects_folder):
+        self.logger.debug('Patch auth-server configuration from {}', objects_folder)
+        endpoint = '/jans-config-api/api/v1/jans-auth-server/config'
+        scopes = 'https://jans.io/oauth/jans-auth-server/config/properties.readonly https://jans.io/oauth/jans-auth-server/config/properties.write'
+        return await self._import_config_async(endpoint, scopes, objects_folder)
+
+    async def get_config_api_config(self):
+        self.logger.debug('Getting config-api config')
+        endpoint = '/jans-config-api/api/v1/api-config'
+        scopes = 'https://jans.io/oauth/config/properties.readonly'
+        return await self._execute_async('GET', endpoint, scopes)
+
+    async def import_config_api_config(self, objects_folder):
+        self.logger.debug('Patch config-api configuration from {}', objects_folder)
+        endpoint = '/jans-config-api/api/v1/api-config'
+        scopes = 'https://jans.io/oauth/config/properties.readonly https://jans.io/oauth/config/properties.write'
+        return await self._import_config_async(endpoint, scopes, objects_folder)
+
+    async def get_scim_config(self):
+        self.logger.debug('Getting scim config')
+        endpoint = '/jans-config-api/scim/scim-config'
+        scopes = 'https://jans.io/scim/config.readonly'
+        return await self._execute_async('GET', endpoint, scopes)
+
+    async def import_scim_config(self, objects_folder):
+        self.logger.debug('Patch scim configuration from {}', objects_folder)
+        endpoint = '/jans-config-api/scim/scim-config'
+        scopes = 'https://jans.io/scim/config.readonly https://jans.io/scim/config.write'
+        return await self._import_config_async(endpoint, scopes, objects_folder)
+
+############################
+# snapshot
+############################
+
+    async def export_snapshot(self, output_folder, max_in_flight=8):
+        self.logger.debug('Exporting snapshot to {}', output_folder)
+        exports = {
+            'attributes': self._export_collection_async(output_folder, 'attributes', '/jans-config-api/api/v1/attributes', 'https://jans.io/oauth/config/attributes.readonly', 'name', max_in_flight),
+            'scopes': self._export_collection_async(output_folder, 'scopes', '/jans-config-api/api/v1/scopes', 'https://jans.io/oauth/config/scopes.readonly', 'id', max_in_flight),
+            'clients': self._export_collection_async(output_folder, 'clients', '/jans-config-api/api/v1/openid/clients', 'https://jans.io/oauth/config/openid/clients.readonly', 'inum', max_in_flight),
+            'script-objects': self._export_collection_async(output_folder, 'script-objects', '/jans-config-api/api/v1/config/scripts', 'https://jans.io/oauth/config/scripts.readonly', 'inum', max_in_flight),
+            'jans_auth_server': self._export_config_async(output_folder, 'jans_auth_server', self.get_auth_server_config()),
+            'config_api': self._export_config_async(output_folder, 'config_api', self.get_config_api_config()),
+            'scim': self._export_config_async(output_folder, 'scim', self.get_scim_config()),
+            'agama': self._export_agama_projects_async(output_folder)
+        }
+        counts = dict(zip(exports, await asyncio.gather(*exports.values())))
+        self.logger.debug('Snapshot exported to {}: {}', output_folder, counts)
+        return counts
+
+    async def _export_collection_async(self, output_folder, folder, endpoint, scopes, key, max_in_flight):
+        entries = await self._list_all_async(endpoint, scopes, max_in_flight)
+        return await self._run_blocking(self._write_collection, output_folder, folder, key, entries)
+
+    async def _export_config_async(self, output_folder, folder, get_config):
+        return await self._run_blocking(self._write_config_patch, output_folder, folder, await get_config)
+
+    async def _export_agama_projects_async(self, output_folder):
+        endpoint = '/jans-config-api/api/v1/agama-deployment'
+        scopes = 'https://jans.io/oauth/config/agama.readonly'
+        deployments = await self._list_all_async(endpoint, scopes, build_page_endpoint=self._build_agama_page_endpoint)
+        agama_project_names = [self._get_agama_project_name(deployment) for deployment in deployments]
+        configs = await asyncio.gather(*[self._execute_async('GET', '{}/configs/{}'.format(endpoint, agama_project_name), scopes) for agama_project_name in agama_project_names])
+        agama_projects = {name: self._build_agama_project_json(name, deployment, project_configs) for name, deployment, project_configs in zip(agama_project_names, deployments, configs)}
+        return await self._run_blocking(self._write_agama_projects, output_folder, agama_projects)
@@ -0,0 +1,163 @@
+# sherpa-py-janssen is available under the MIT License. https://github.com/Identicum/sherpa-py-janssen/
+# Copyright (c) 2026, Identicum - https://identicum.com/
+#
+# Authors:
+#   Ezequiel O Sandoval - esandoval@identicum.com
+#   Gustavo J Gallardo - ggallard@identicum.com
+#
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sherpa.janssen.janssen_lib import ConfigAPIClient, PreparationCache
+
+############################
+# Fan-out deployment
+#
+# deploys the same customization to many Janssen instances. Each target is a dict of properties overriding the
+# base properties (at least idp_hostname). A deploy function receives the ConfigAPIClient of each target, e.g.
+#   FanOutDeployer(logger, properties, targets, max_parallel=8, canary=1).deploy(lambda client: run(client))
+# host independent work (reading files, hashing and zipping Agama projects) is done once for all targets.
+# up to max_parallel targets are deployed at a time. With canary=N the first N targets are deployed first and,
+# if any of them fails, the rollout stops and the remaining targets are reported as skipped.
+# logs of each target are prefixed with its name, failures are raised together as FanOutDeploymentError.
+############################
+
+class OverlayProperties:
+
+    def __init__(self, properties, overrides):
+        self.properties = properties
+        self.overrides = overrides
+
+    def get(self, key):
+        if key in self.overrides:
+            return self.overrides[key]
+        return self.properties.get(key)
+
+    def __getattr__(self, name):
+        return getattr(self.properties, name)
+
+
+class TargetLogger:
+
+    def __init__(self, logger, name):
+        self._logger = logger
+        self._prefix = '[{}] '.format(name)
+
+    def __getattr__(self, name):
+        log_method = getattr(self._logger, name)
+        if not callable(log_method):
+            return log_method
+        return lambda message, *args, **kwargs: log_method(self._prefix + str(message), *args, **kwargs)
+
+
+class TargetResult:
+
+    def __init__(self, name, status, elapsed=0, result=None, error=None, metrics=None):
+        self.name = name
+        self.status = status
+        self.elapsed = elapsed
+        self.result = result
+        self.error = error
+        self.metrics = metrics
+
+
+class FanOutReport:
+
+    def __init__(self):
+        self.targets = {}
+
+    def add(self, target_result):
+        self.targets[target_result.name] = target_result
+
+    def get(self, status):
+        return [x.name for x in self.targets.values() if x.status == status]
+
+    @property
+    def succeeded(self):
+        return self.get('succeeded')
+
+    @property
+    def failed(self):
+        return self.get('failed')
+
+    @property
+    def skipped(self):
+        return self.get('skipped')
+
+    def __str__(self):
+        lines = []
+        for target_result in self.targets.values():
+            line = '{}: {} ({:.1f} secs)'.format(target_result.name, target_result.status, target_result.elapsed)
+            if target_result.error is not None:
+                line += ' - {}'.format(target_result.error)
+            lines.append(line)
+        lines.append('succeeded: {}, failed: {}, skipped: {}'.format(len(self.succeeded), len(self.failed), len(self.skipped)))
+        return '\n'.join(lines)
+
+
+class FanOutDeploymentError(Exception):
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__('{} targets failed to deploy: {}'.format(len(report.failed), ', '.join(report.failed)))
+
+
+class FanOutDeployer:
+
+    def __init__(self, logger, properties, targets, max_parallel=4, canary=0, client_class=ConfigAPIClient, **client_options):
+        self.logger = logger
+        self.properties = properties
+        self.targets = [OverlayProperties(properties, overrides) for overrides in targets]
+        self.max_parallel = max_parallel
+        self.canary = canary
+        self.client_class = client_class
+        self.client_options = client_options
+
+    def _get_target_name(self, target_properties):
+        return target_properties.get('idp_hostname')
+
+    def deploy(self, deploy_function):
+        report = FanOutReport()
+        with PreparationCache(self.logger) as preparation_cache:
+            canary_targets = self.targets[:self.canary]
+            remaining_targets = self.targets[self.canary:]
+            if canary_targets:
+                self.logger.debug('Deploying {} canary targets', len(canary_targets))
+                self._deploy_targets(canary_targets, deploy_function, preparation_cache, report)
+                if report.failed:
+                    self.logger.error('Canary deployment failed, {} targets skipped', len(remaining_targets))
+                    for target_properties in remaining_targets:
+                        report.add(TargetResult(self._get_target_name(target_properties), 'skipped'))
+                    remaining_targets = []
+            self._deploy_targets(remaining_targets, deploy_function, preparation_cache, report)
+        self.logger.debug('Fan-out deployment report:\n{}', report)
+        if report.failed:
+            raise FanOutDeploymentError(report)
+        return report
+
+    def _deploy_targets(self, targets, deploy_function, preparation_cache, report):
+        if not targets:
+            return
+        self.logger.debug('Deploying {} targets with up to {} in parallel', len(targets), self.max_parallel)
+        with ThreadPoolExecutor(max_workers=max(1, self.max_parallel)) as executor:
+            futures = [executor.submit(self._deploy_target, target_properties, deploy_function, preparation_cache) for target_properties in targets]
+            for future in futures:
+                report.add(future.result())
+
+    def _deploy_target(self, target_properties, deploy_function, preparation_cache):
+        name = self._get_target_name(target_properties)
+        target_logger = TargetLogger(self.logger, name)
+        started_at = time.monotonic()
+        config_api_client = None
+        try:
+            config_api_client = self.client_class(target_logger, target_properties, preparation_cache=preparation_cache, **self.client_options)
+            result = deploy_function(config_api_client)
+            target_logger.debug('Deployed in {:.1f} secs', time.monotonic() - started_at)
+            return TargetResult(name, 'succeeded', time.monotonic() - started_at, result, metrics=config_api_client.metrics.report())
+        except Exception as e:
+            target_logger.error('Deployment failed: {}', e)
+            metrics = None if config_api_client is None else config_api_client.metrics.report()
+            return TargetResult(name, 'failed', time.monotonic() - started_at, error=e, metrics=metrics)
+        finally:
+            if config_api_client is not None:
+                config_api_client.close()
@@ -7,201 +7,1272 @@
 #   Gustavo J Gallardo - ggallard@identicum.com
 #
 
+import asyncio
+import copy
+import hashlib
+import itertools
 import json
+import random
+import re
 import requests
 import os
 import shutil
+import tempfile
 import zipfile
 import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
 from sherpa.utils.clients import OIDCClient
 from sherpa.utils import http
 from pathlib import Path
 from importlib.metadata import version
 
 
-class ConfigAPIClient:
+############################
+# Access token cache
+#
+# client_credentials tokens are cached by granted scope set and reused for any request
+# whose scopes are a subset of a cached token. Tokens are refreshed expiry_margin secs
+# before they expire, so a token is never sent when it is about to be rejected.
+############################
+
+class TokenCache:
+
+    def __init__(self, logger, oidc_client, client_id, client_secret, expiry_margin=30):
+        self.logger = logger
+        self.oidc_client = oidc_client
+        self.b64_creds = http.to_base64_creds(client_id, client_secret)
+        self.expiry_margin = expiry_margin
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def get_token(self, scopes):
+        requested = frozenset(scopes.split())
+        with self._lock:
+            acc_token = self._find_token(requested)
+            if acc_token is None:
+                acc_token = self._request_token(requested)
+            return acc_token
+
+    def find_token(self, scopes):
+        # never waits for the lock (held while requesting a token), so it can be called from an event loop
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            return self._find_token(frozenset(scopes.split()))
+        finally:
+            self._lock.release()
+
+    def prefetch(self, scopes):
+        requested = frozenset(scopes.split())
+        with self._lock:
+            if self._find_token(requested) is None:
+                self._request_token(requested)
+
+    def invalidate(self, acc_token):
+        with self._lock:
+            for granted, (cached_token, expires_at) in list(self._tokens.items()):
+                if cached_token == acc_token:
+                    self.logger.trace('Invalidating cached acc_token for scopes: {}', ' '.join(sorted(granted)))
+                    del self._tokens[granted]
+
+    def _find_token(self, requested):
+        now = time.monotonic()
+        for granted, (acc_token, expires_at) in list(self._tokens.items()):
+            if expires_at - self.expiry_margin <= now:
+                del self._tokens[granted]
+            elif requested <= granted:
+                return acc_token
+        return None
+
+    def _request_token(self, requested):
+        self.logger.trace('Getting acc_token for scopes: {}', ' '.join(sorted(requested)))
+        params = {
+            'grant_type': 'client_credentials',
+            'scope': ' '.join(sorted(requested))
+        }
+        requested_at = time.monotonic()
+        token_response = self.oidc_client.request_to_token_endpoint(self.b64_creds, params)
+        acc_token = token_response.get('access_token')
+        granted_scope = token_response.get('scope')
+        granted = frozenset(granted_scope.split()) if granted_scope else requested
+        if not requested <= granted:
+            self.logger.debug('Scopes not granted to acc_token: {}', ' '.join(sorted(requested - granted)))
+        expires_at = requested_at + int(token_response.get('expires_in', 0))
+        if expires_at - self.expiry_margin > requested_at:
+            # scopes the AS did not grant would not be granted to a new acc_token either, the token also serves them
+            self._tokens[granted | requested] = (acc_token, expires_at)
+        else:
+            self.logger.debug('acc_token lifetime is shorter than the expiry margin, it will not be cached')
+        return acc_token
+
+
+############################
+# Concurrent imports
+#
+# Each object is imported by its own pipeline (GET, diff, POST/PUT/PATCH). Pipelines
+# run on a bounded worker pool when configapi_max_in_flight > 1; their logs are buffered
+# per object and replayed in file order. Failures are collected in an ImportSummary and
+# raised together as a ConfigAPIImportError once every object has been processed.
+############################
+
+class BufferedLogger:
+
+    def __init__(self, logger):
+        self._logger = logger
+        # a context variable isolates buffers per thread and per asyncio task
+        self._records = ContextVar('records', default=None)
+
+    def __getattr__(self, name):
+        log_method = getattr(self._logger, name)
+        records = self._records.get()
+        if records is None or not callable(log_method):
+            return log_method
+        return lambda *args, **kwargs: records.append((log_method, args, kwargs))
+
+    @contextmanager
+    def buffered(self):
+        records = []
+        token = self._records.set(records)
+        try:
+            yield records
+        finally:
+            self._records.reset(token)
+
+    def replay(self, records):
+        for log_method, args, kwargs in records:
+            log_method(*args, **kwargs)
+
+
+class ImportSummary:
+
+    def __init__(self):
+        self.results = {}
+        self.errors = {}
+
+    def add(self, name, result):
+        self.results[name] = result
+
+    def add_error(self, name, error):
+        self.errors[name] = error
+
+    def __str__(self):
+        counts = {}
+        for result in self.results.values():
+            counts[result] = counts.get(result, 0) + 1
+        counts['failed'] = len(self.errors)
+        return ', '.join('{}: {}'.format(result, count) for result, count in sorted(counts.items()))
+
+
+class ConfigAPIImportError(Exception):
+
+    def __init__(self, summary):
+        self.summary = summary
+        super().__init__('{} objects failed to import: {}'.format(len(summary.errors), ', '.join(sorted(summary.errors))))
+
+
+############################
+# Applied state manifest
+#
+# Content hashes of the objects applied to each Jans host, persisted in a JSON file:
+# { host: { section: { name: hash } } }
+############################
+
+class StateManifest:
+
+    # clients of different hosts may share the state file, saves are serialized per file
+    _file_locks = {}
+    _file_locks_lock = threading.Lock()
+
+    def __init__(self, logger, file_path, host):
+        self.logger = logger
+        self.file_path = file_path
+        self.host = host
+        self._lock = threading.Lock()
+        self._state = {}
+        if os.path.isfile(file_path):
+            with open(file_path) as state_file:
+                self._state = json.load(state_file)
+            self.logger.trace('Applied state loaded from {}', file_path)
+
+    def get(self, section, name):
+        with self._lock:
+            return self._state.get(self.host, {}).get(section, {}).get(name)
+
+    def set(self, section, name, content_hash):
+        with self._lock:
+            self._state.setdefault(self.host, {}).setdefault(section, {})[name] = content_hash
+
+    def remove(self, section, name):
+        with self._lock:
+            self._state.get(self.host, {}).get(section, {}).pop(name, None)
+
+    def save(self):
+        with self._get_file_lock(), self._lock:
+            # other hosts sections are re-read, they may have been saved by another client since this one was created
+            state = {}
+            if os.path.isfile(self.file_path):
+                with open(self.file_path) as state_file:
+                    state = json.load(state_file)
+            state[self.host] = self._state.get(self.host, {})
+            temp_file_path = '{}.{}.tmp'.format(self.file_path, threading.get_ident())
+            with open(temp_file_path, 'w') as state_file:
+                json.dump(state, state_file, indent=2, sort_keys=True)
+            os.replace(temp_file_path, self.file_path)
+        self.logger.trace('Applied state saved to {}', self.file_path)
+
+    def _get_file_lock(self):
+        with self._file_locks_lock:
+            return self._file_locks.setdefault(os.path.abspath(self.file_path), threading.Lock())
+
+
+############################
+# Preparation cache
+#
+# Host independent work shared by the clients of a fan-out deployment: customization files and folders are read
+# once and Agama projects are hashed and zipped once. Properties templating still runs per client, since targets
+# may override properties. Zip files are kept in the cache temp dir until close().
+############################
+
+class PreparationCache:
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.temp_dir = None
+        self._values = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # concurrent clients wait for the first one to prepare the value instead of preparing it again
+        with key_lock:
+            with self._lock:
+                if key in self._values:
+                    return self._values[key]
+            value = factory()
+            with self._lock:
+                self._values[key] = value
+            return value
+
+    def get_temp_dir(self):
+        with self._lock:
+            if self.temp_dir is None:
+                self.temp_dir = tempfile.mkdtemp(prefix='sherpa-janssen-')
+                self.logger.trace('Created preparation temp dir: {}', self.temp_dir)
+            return self.temp_dir
+
+    def close(self):
+        with self._lock:
+            self._values.clear()
+            self._key_locks.clear()
+            if self.temp_dir is not None:
+                shutil.rmtree(self.temp_dir, ignore_errors=True)
+                self.temp_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-    def __init__(self, logger, properties, verify=True):
+
+############################
+# Request metrics
+#
+# Every Config API request is recorded with its endpoint template (ids replaced by {id}), status, wire time of
+# each attempt, bytes sent/received, retries and the time spent getting tokens, waiting for the rate limiter and
+# backing off between retries. Local phases (templating, diffing, zipping, agama waiting) are timed with phase().
+# report() summarizes the run: p50/p95/p99 wire latency per endpoint and objects per import result. Times summed
+# over requests run concurrently, so wire_time / wall_time is the average number of requests on the wire.
+# Listeners receive every request and phase event.
+############################
+
+class RequestMetrics:
+
+    ENDPOINT_BASES = (
+        '/jans-config-api/api/v1/attributes',
+        '/jans-config-api/api/v1/scopes',
+        '/jans-config-api/api/v1/openid/clients',
+        '/jans-config-api/api/v1/config/scripts',
+        '/jans-config-api/api/v1/agama-deployment'
+    )
+    ENDPOINT_KEYWORDS = ('inum', 'configs')
+
+    def __init__(self, logger):
         self.logger = logger
+        self.listeners = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = []
+            self.phases = {}
+            self.objects = {}
+            self.started_at = time.monotonic()
+            self.cpu_started_at = time.process_time()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def _notify(self, event):
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                self.logger.debug('Metrics listener failed: {}', e)
+
+    def get_endpoint_template(self, operation, endpoint):
+        path = endpoint.split('?')[0]
+        for base in self.ENDPOINT_BASES:
+            if path.startswith(base + '/'):
+                segments = path[len(base) + 1:].split('/')
+                path = '/'.join([base] + [x if x in self.ENDPOINT_KEYWORDS else '{id}' for x in segments])
+                break
+        return '{} {}'.format(operation, path)
+
+    def record_request(self, operation, endpoint, status, duration, bytes_sent, bytes_received, retries, token_time, wire_times=(), limiter_wait_time=0, backoff_time=0):
+        event = dict(type='request', endpoint=self.get_endpoint_template(operation, endpoint), status=status, duration=duration,
+                     wire_times=list(wire_times), bytes_sent=bytes_sent, bytes_received=bytes_received, retries=retries,
+                     token_time=token_time, limiter_wait_time=limiter_wait_time, backoff_time=backoff_time)
+        with self._lock:
+            self.requests.append(event)
+        self._notify(event)
+
+    @contextmanager
+    def phase(self, name):
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - started_at
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0) + duration
+            self._notify(dict(type='phase', phase=name, duration=duration))
+
+    def record_summary(self, summary):
+        with self._lock:
+            for result in list(summary.results.values()) + ['failed'] * len(summary.errors):
+                self.objects[result] = self.objects.get(result, 0) + 1
+
+    def _percentile(self, sorted_values, percentile):
+        if not sorted_values:
+            return 0
+        index = max(0, int(round(percentile / 100.0 * len(sorted_values))) - 1)
+        return sorted_values[min(index, len(sorted_values) - 1)]
+
+    def report(self):
+        with self._lock:
+            requests_by_endpoint = {}
+            for request in self.requests:
+                requests_by_endpoint.setdefault(request['endpoint'], []).append(request)
+            endpoints = {}
+            for endpoint, requests in sorted(requests_by_endpoint.items()):
+                # latency percentiles are over attempts on the wire, without token, rate limiter and backoff waits
+                wire_times = sorted(x for request in requests for x in request['wire_times'])
+                statuses = {}
+                for request in requests:
+                    statuses[str(request['status'])] = statuses.get(str(request['status']), 0) + 1
+                endpoints[endpoint] = dict(
+                    count=len(requests), attempts=len(wire_times), statuses=statuses, retries=sum(x['retries'] for x in requests),
+                    p50=self._percentile(wire_times, 50), p95=self._percentile(wire_times, 95), p99=self._percentile(wire_times, 99),
+                    total_time=sum(wire_times), bytes_sent=sum(x['bytes_sent'] for x in requests), bytes_received=sum(x['bytes_received'] for x in requests)
+                )
+            wall_time = time.monotonic() - self.started_at
+            wire_time = sum(sum(x['wire_times']) for x in self.requests)
+            return dict(
+                wall_time=wall_time,
+                cpu_time=time.process_time() - self.cpu_started_at,
+                wire_time=wire_time,
+                token_time=sum(x['token_time'] for x in self.requests),
+                limiter_wait_time=sum(x['limiter_wait_time'] for x in self.requests),
+                backoff_time=sum(x['backoff_time'] for x in self.requests),
+                average_in_flight=wire_time / wall_time if wall_time else 0,
+                requests=len(self.requests),
+                endpoints=endpoints,
+                phases=dict(self.phases),
+                objects=dict(self.objects)
+            )
+
+    def to_json(self):
+        return json.dumps(self.report(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix='sherpa_janssen'):
+        report = self.report()
+        lines = ['# TYPE {}_request_duration_seconds summary'.format(prefix)]
+        for endpoint, stats in report['endpoints'].items():
+            label = 'endpoint="{}"'.format(endpoint.replace('\\', '\\\\').replace('"', '\\"'))
+            for quantile, key in (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99')):
+                lines.append('{}_request_duration_seconds{{{},quantile="{}"}} {}'.format(prefix, label, quantile, stats[key]))
+            lines.append('{}_request_duration_seconds_sum{{{}}} {}'.format(prefix, label, stats['total_time']))
+            lines.append('{}_request_duration_seconds_count{{{}}} {}'.format(prefix, label, stats['attempts']))
+            lines.append('{}_requests_total{{{}}} {}'.format(prefix, label, stats['count']))
+            lines.append('{}_request_retries_total{{{}}} {}'.format(prefix, label, stats['retries']))
+            lines.append('{}_request_bytes_sent_total{{{}}} {}'.format(prefix, label, stats['bytes_sent']))
+            lines.append('{}_request_bytes_received_total{{{}}} {}'.format(prefix, label, stats['bytes_received']))
+        for phase, duration in sorted(report['phases'].items()):
+            lines.append('{}_phase_seconds{{phase="{}"}} {}'.format(prefix, phase, duration))
+        for result, count in sorted(report['objects'].items()):
+            lines.append('{}_objects_total{{result="{}"}} {}'.format(prefix, result, count))
+        for key in ('wall_time', 'cpu_time', 'wire_time', 'token_time', 'limiter_wait_time', 'backoff_time'):
+            lines.append('{}_{}_seconds {}'.format(prefix, key, report[key]))
+        lines.append('{}_average_in_flight {}'.format(prefix, report['average_in_flight']))
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, file_path, prometheus_file_path=None):
+        with open(file_path, 'w') as report_file:
+            report_file.write(self.to_json())
+        if prometheus_file_path:
+            with open(prometheus_file_path, 'w') as prometheus_file:
+                prometheus_file.write(self.to_prometheus())
+        self.logger.debug('Metrics report written to {}', file_path)
+
+
+############################
+# Adaptive rate limiting
+#
+# Shared by every request of a ConfigAPIClient: a token bucket limits requests/sec (configapi_rate_limit, 0 = unlimited)
+# and a gate limits requests in flight (configapi_max_requests_in_flight). Both limits adapt AIMD style: they are halved
+# on HTTP 429/503, timeouts and connection errors, or when an endpoint average latency rises over configapi_latency_threshold
+# times its best one, at most once per round trip. After each configapi_rate_limit_interval without congestion one request
+# in flight and configapi_rate_limit_step requests/sec are added back, up to the configured limits.
+############################
+
+class AdaptiveRateLimiter:
+
+    CONGESTION_STATUS_CODES = (429, 503)
+
+    def __init__(self, logger, max_in_flight, rate=0, rate_step=1, latency_threshold=3, interval=1, decrease_factor=0.5):
+        self.logger = logger
+        self.max_in_flight = max_in_flight
+        self.max_rate = rate
+        self.rate_step = rate_step
+        self.latency_threshold = latency_threshold
+        self.interval = interval
+        self.decrease_factor = decrease_factor
+        self.in_flight_limit = float(max_in_flight)
+        self.rate = float(rate)
+        self.in_flight = 0
+        self.tokens = float(rate)
+        self.latencies = {}
+        self.best_latencies = {}
+        self._refilled_at = time.monotonic()
+        self._adjusted_at = self._refilled_at
+        self._decreased_at = self._refilled_at
+        self._condition = threading.Condition()
+        self._async_waiters = []
+
+    def acquire(self):
+        with self._condition:
+            while True:
+                delay = self._try_acquire()
+                if delay == 0:
+                    return
+                self._condition.wait(delay)
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                delay = self._try_acquire()
+                if delay == 0:
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                # woken by release(), like acquire() by notify_all(), or after delay for rate limit refills
+                await asyncio.wait([waiter], timeout=delay)
+            finally:
+                with self._condition:
+                    if (loop, waiter) in self._async_waiters:
+                        self._async_waiters.remove((loop, waiter))
+
+    def _notify_async_waiters(self):
+        async_waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in async_waiters:
+            try:
+                loop.call_soon_threadsafe(self._wake_async_waiter, waiter)
+            except RuntimeError:
+                # the event loop of the waiter is closed
+                pass
+
+    def _wake_async_waiter(self, waiter):
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def _try_acquire(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.rate, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+        if self.in_flight >= int(self.in_flight_limit):
+            return self.interval
+        if self.rate and self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        if self.rate:
+            self.tokens -= 1
+        self.in_flight += 1
+        return 0
+
+    def release(self, endpoint, status, latency):
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if status is None or status in self.CONGESTION_STATUS_CODES:
+                congested = True
+            else:
+                congested = status < 400 and self._update_latency(endpoint, latency)
+            if congested:
+                # requests sent before the last decrease were sent with the old limits, they do not decrease them again
+                if now - latency >= self._decreased_at:
+                    self._decrease(now)
+            elif now - self._adjusted_at >= self.interval:
+                self._increase(now)
+            self._condition.notify_all()
+            self._notify_async_waiters()
+
+    def _update_latency(self, endpoint, latency):
+        # endpoints have very different latencies (searches, agama uploads), each one is compared with its own best
+        average = self.latencies.get(endpoint)
+        average = self.latencies[endpoint] = latency if average is None else 0.8 * average + 0.2 * latency
+        best_latency = self.best_latencies[endpoint] = min(average, self.best_latencies.get(endpoint, average))
+        return bool(self.latency_threshold) and average > best_latency * self.latency_threshold
+
+    def _decrease(self, now):
+        self._adjusted_at = self._decreased_at = now
+        self.in_flight_limit = max(1, self.in_flight_limit * self.decrease_factor)
+        if self.max_rate:
+            self.rate = max(1, self.rate * self.decrease_factor)
+        self.logger.debug('Config API is overloaded, limiting to {} requests in flight, {} requests/sec', int(self.in_flight_limit), self.rate or 'unlimited')
+
+    def _increase(self, now):
+        self._adjusted_at = now
+        if self.in_flight_limit >= self.max_in_flight and self.rate >= self.max_rate:
+            return
+        self.in_flight_limit = min(self.max_in_flight, self.in_flight_limit + 1)
+        if self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.rate_step)
+        self.logger.trace('Config API is healthy, raising limits to {} requests in flight, {} requests/sec', int(self.in_flight_limit), self.rate or 'unlimited')
+
+
+class ConfigAPIClient:
+
+    RETRY_STATUS_CODES = (429, 502, 503, 504)
+    # 429 and 503 are rejected before processing, so they are also safe to retry on POST
+    RETRY_STATUS_CODES_NOT_IDEMPOTENT = (429, 503)
+    # JSON Patch is not idempotent (add .../-, remove /list/N), PATCH is retried like POST
+    IDEMPOTENT_OPERATIONS = ('GET', 'PUT', 'DELETE')
+    IMPORT_RESULTS = {'POST': 'created', 'PUT': 'updated', 'PATCH': 'patched', None: 'unchanged'}
+
+    ALL_SCOPES = ' '.join([
+        'https://jans.io/oauth/config/attributes.readonly', 'https://jans.io/oauth/config/attributes.write',
+        'https://jans.io/oauth/config/scopes.readonly', 'https://jans.io/oauth/config/scopes.write',
+        'https://jans.io/oauth/config/openid/clients.readonly', 'https://jans.io/oauth/config/openid/clients.write',
+        'https://jans.io/oauth/config/scripts.readonly', 'https://jans.io/oauth/config/scripts.write',
+        'https://jans.io/oauth/config/agama.readonly', 'https://jans.io/oauth/config/agama.write', 'https://jans.io/oauth/config/agama.delete',
+        'https://jans.io/oauth/jans-auth-server/config/properties.readonly', 'https://jans.io/oauth/jans-auth-server/config/properties.write',
+        'https://jans.io/oauth/config/properties.readonly', 'https://jans.io/oauth/config/properties.write',
+        'https://jans.io/scim/config.readonly', 'https://jans.io/scim/config.write'
+    ])
+
+    def __init__(self, logger, properties, verify=True, incremental=False, full=False, detect_drift=False, preparation_cache=None):
+        self.logger = BufferedLogger(logger)
         self.properties = properties
         self.logger.debug("ConfigAPIClient version: " + version("sherpa-py-janssen"))
-        self.base_uri = 'https://{}'.format(self.properties.get('idp_hostname'))
+        self.idp_hostname = self.properties.get('idp_hostname')
+        # idp_hostname may include the scheme, e.g. http://localhost:8080 for a local Config API
+        self.base_uri = self.idp_hostname if '://' in self.idp_hostname else 'https://{}'.format(self.idp_hostname)
         self.oidc_client = OIDCClient(self.base_uri, logger, verify=verify)
-        self.temp_dir = './work'
+        self.token_cache = TokenCache(self.logger, self.oidc_client, self.properties.get('configapi_client_id'), self.properties.get('configapi_client_secret'))
+        self.temp_dir = None
+        self._temp_dir_lock = threading.Lock()
+        self.placeholder_pattern = re.compile(self._get_property('configapi_placeholder_pattern', r'\$\{([^}]+)\}', str))
         self.verify = verify
-        shutil.rmtree(self.temp_dir, ignore_errors=True)
-        os.mkdir(self.temp_dir, 0o744)
+        self.incremental = incremental
+        self.full = full
+        self.detect_drift = detect_drift
+        self.preparation_cache = preparation_cache
+        self.timeout = (self._get_property('configapi_connect_timeout', 10, float), self._get_property('configapi_read_timeout', 60, float))
+        self.max_retries = self._get_property('configapi_max_retries', 3)
+        self.backoff_factor = self._get_property('configapi_backoff_factor', 0.5, float)
+        self.max_backoff = self._get_property('configapi_max_backoff', 30, float)
+        self.page_size = self._get_property('configapi_page_size', 200)
+        self.max_in_flight = self._get_property('configapi_max_in_flight', 1)
+        self.agama_max_in_flight = self._get_property('configapi_agama_max_in_flight', 8)
+        self.agama_poll_interval = self._get_property('configapi_agama_poll_interval', 1, float)
+        self.state = StateManifest(self.logger, self._get_property('configapi_state_file', './.sherpa-janssen-state.json', str), self.idp_hostname)
+        self.session = self._build_session(max(self._get_property('configapi_pool_size', 10), self.max_in_flight))
+        self.rate_limiter = AdaptiveRateLimiter(
+            self.logger,
+            self._get_property('configapi_max_requests_in_flight', max(self._get_property('configapi_pool_size', 10), self.max_in_flight)),
+            self._get_property('configapi_rate_limit', 0, float),
+            self._get_property('configapi_rate_limit_step', 1, float),
+            self._get_property('configapi_latency_threshold', 3, float),
+            self._get_property('configapi_rate_limit_interval', 1, float)
+        )
+        self.scope_dns = {}
+        self._scope_dns_lock = threading.Lock()
+        self.metrics = RequestMetrics(self.logger)
 
-    def _execute_with_json_response(self, operation, endpoint, scopes, payload={}):
-        self.logger.debug('{} {}', operation, endpoint)
-        url = '{}{}'.format(self.base_uri, endpoint)
-        self.logger.trace('Getting acc_token for operation')
-        client_id = self.properties.get('configapi_client_id')
-        client_secret = self.properties.get('configapi_client_secret')
-        b64_creds = http.to_base64_creds(client_id, client_secret)
+    def _get_property(self, key, default, cast=int):
+        try:
+            value = self.properties.get(key)
+        except KeyError:
+            value = None
+        return default if value is None or value == '' else cast(value)
+
+    def _build_session(self, pool_size):
+        self.logger.trace('Building HTTP session with pool size: {}', pool_size)
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def close(self):
+        self.session.close()
+        if self.temp_dir is not None:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            self.temp_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _is_retryable(self, operation, status_code):
+        if operation in self.IDEMPOTENT_OPERATIONS:
+            return status_code in self.RETRY_STATUS_CODES
+        return status_code in self.RETRY_STATUS_CODES_NOT_IDEMPOTENT
+
+    def _get_error_retry_delay(self, operation, endpoint, attempt, error, connect_failed):
+        # returns the secs to wait before retrying a failed request, None when it must not be retried
+        # only a failed connect guarantees a non idempotent request was not processed
+        if attempt >= self.max_retries or not (operation in self.IDEMPOTENT_OPERATIONS or connect_failed):
+            return None
+        delay = self._get_retry_delay(attempt)
+        self.logger.debug('{} {} failed: {}. Retrying in {:.2f} secs', operation, endpoint, error, delay)
+        return delay
+
+    def _get_response_retry_delay(self, operation, endpoint, attempt, status_code, response):
+        # returns the secs to wait before retrying a response, None when it must not be retried
+        if attempt >= self.max_retries or not self._is_retryable(operation, status_code):
+            return None
+        delay = self._get_retry_delay(attempt, response)
+        self.logger.debug('{} {} returned HTTP {}. Retrying in {:.2f} secs', operation, endpoint, status_code, delay)
+        return delay
+
+    def _get_retry_delay(self, attempt, response=None):
+        retry_after = None if response is None else response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                return min(max(delay, 0), self.max_backoff)
+        # full jitter exponential backoff
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+    def _build_request_body(self, operation, endpoint, payload):
         is_agama_deploy = operation == 'POST' and 'agama-deployment' in endpoint
-        params = {
-            'grant_type': 'client_credentials',
-            'scope': scopes
-        }
-        acc_token = self.oidc_client.request_to_token_endpoint(b64_creds, params).get('access_token')
         if is_agama_deploy:
+            # zip files are streamed from disk by _send_request
             content_type = "application/zip"
-            with open(payload, "rb") as file:
-                body = file.read()
+            body = payload
         else:
             content_type = 'application/json' if operation != 'PATCH' else 'application/json-patch+json'
             body = json.dumps(payload)
+        return is_agama_deploy, content_type, body
 
-        headers = {
-            'Authorization': 'Bearer {}'.format(acc_token),
-            'Content-Type': content_type
-        }
+    def _send_limited_request(self, operation, endpoint, url, headers, body, is_agama_deploy, stats):
+        waiting_at = time.monotonic()
+        self.rate_limiter.acquire()
+        sent_at = time.monotonic()
+        stats['limiter_wait_time'] += sent_at - waiting_at
+        status = None
+        try:
+            response = self._send_request(operation, url, headers, body, is_agama_deploy)
+            status = response.status_code
+            return response
+        finally:
+            wire_time = time.monotonic() - sent_at
+            stats['wire_times'].append(wire_time)
+            self.rate_limiter.release(self.metrics.get_endpoint_template(operation, endpoint), status, wire_time)
 
-        self.logger.trace('OPERATION: {}, URL: {}, HEADERS: {}, DATA: {}', operation, url, headers, body)
+    def _send_request(self, operation, url, headers, body, is_agama_deploy=False):
         if operation == 'GET':
-            response = requests.request(operation, url, headers=headers, verify=self.verify)
-        else:
-            response = requests.request(operation, url, headers=headers, data=body, verify=self.verify)
+            return self.session.request(operation, url, headers=headers, verify=self.verify, timeout=self.timeout)
+        if is_agama_deploy:
+            with open(body, "rb") as file:
+                return self.session.request(operation, url, headers=headers, data=file, verify=self.verify, timeout=self.timeout)
+        return self.session.request(operation, url, headers=headers, data=body, verify=self.verify, timeout=self.timeout)
+
+    def _execute_with_json_response(self, operation, endpoint, scopes, payload={}):
+        self.logger.debug('{} {}', operation, endpoint)
+        url = '{}{}'.format(self.base_uri, endpoint)
+        is_agama_deploy, content_type, body = self._build_request_body(operation, endpoint, payload)
+        stats = self._new_request_stats()
+        try:
+            response = self._execute_with_retries(operation, endpoint, scopes, url, content_type, body, is_agama_deploy, stats)
+        finally:
+            self._record_request(operation, endpoint, body, is_agama_deploy, stats)
         http.validate_response(response, self.logger, 'Execute Failed - HTTP Code: {}'.format(response.status_code))
-        payload = {} if operation == 'DELETE' or is_agama_deploy else response.json()
+        payload = {} if operation == 'DELETE' or is_agama_deploy or not response.content else response.json()
         self.logger.trace('{} JSON response - {}', operation, payload)
         return payload
 
+    def _new_request_stats(self):
+        return dict(started_at=time.monotonic(), token_time=0, limiter_wait_time=0, backoff_time=0, wire_times=[], retries=0, status=None, bytes_received=0)
+
+    def _record_request(self, operation, endpoint, body, is_agama_deploy, stats):
+        self.metrics.record_request(
+            operation, endpoint, stats['status'],
+            time.monotonic() - stats['started_at'],
+            self._get_body_size(operation, body, is_agama_deploy),
+            stats['bytes_received'],
+            stats['retries'],
+            stats['token_time'],
+            stats['wire_times'],
+            stats['limiter_wait_time'],
+            stats['backoff_time']
+        )
+
+    def _get_body_size(self, operation, body, is_agama_deploy):
+        if operation == 'GET':
+            return 0
+        if is_agama_deploy:
+            return os.path.getsize(body)
+        return len(body.encode('utf-8'))
+
+    def _execute_with_retries(self, operation, endpoint, scopes, url, content_type, body, is_agama_deploy, stats):
+        attempt = 0
+        token_refreshed = False
+        while True:
+            self.logger.trace('Getting acc_token for operation')
+            token_started_at = time.monotonic()
+            acc_token = self.token_cache.get_token(scopes)
+            stats['token_time'] += time.monotonic() - token_started_at
+            headers = {
+                'Authorization': 'Bearer {}'.format(acc_token),
+                'Content-Type': content_type
+            }
+            self.logger.trace('OPERATION: {}, URL: {}, HEADERS: {}, DATA: {}', operation, url, headers, body)
+            try:
+                response = self._send_limited_request(operation, endpoint, url, headers, body, is_agama_deploy, stats)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = self._get_error_retry_delay(operation, endpoint, attempt, e, isinstance(e, requests.ConnectTimeout))
+                if delay is None:
+                    raise
+                self._backoff(delay, stats)
+                attempt += 1
+                stats['retries'] += 1
+                continue
+            stats['status'] = response.status_code
+            stats['bytes_received'] += len(response.content)
+            if response.status_code == 401 and not token_refreshed:
+                self.logger.debug('acc_token rejected by {}, requesting a new one', endpoint)
+                self.token_cache.invalidate(acc_token)
+                token_refreshed = True
+                stats['retries'] += 1
+                continue
+            delay = self._get_response_retry_delay(operation, endpoint, attempt, response.status_code, response)
+            if delay is not None:
+                self._backoff(delay, stats)
+                attempt += 1
+                stats['retries'] += 1
+                continue
+            return response
+
+    def _backoff(self, delay, stats):
+        time.sleep(delay)
+        stats['backoff_time'] += delay
+
+    def prefetch_token(self, scopes=ALL_SCOPES):
+        self.logger.debug('Prefetching acc_token for scopes: {}', scopes)
+        self.token_cache.prefetch(scopes)
+
     def _get_object(self, endpoint, scopes):
         return self._execute_with_json_response("GET", endpoint, scopes)
         
-    def _get_files_path(self, objects_folder, extension='.json'):
-        files = list()
-        try:
-            for directory_entry in sorted(os.scandir(objects_folder), key=lambda path: path.name):
-                file_path = directory_entry.path
-                if directory_entry.is_file() and file_path.endswith(extension):
-                    temp_file = '{}/{}'.format(self.temp_dir,os.path.basename(file_path))
-                    shutil.copyfile(file_path, temp_file)
-                    self.properties.replace(temp_file)
-                    files.append(temp_file)
-        except:
+    def _iter_objects(self, objects_folder, extension='.json'):
+        file_paths = self._prepare(('folder', str(objects_folder), extension), lambda: self._list_object_files(objects_folder, extension))
+        if file_paths is None:
             self.logger.debug("Folder {} is not present", objects_folder)
-        return files
+            return
+        for file_path in file_paths:
+            self.logger.trace('Loading file: {}', file_path)
+            json_text = self._read_file(file_path)
+            with self.metrics.phase('templating'):
+                json_data = self._load_json(self._render(json_text))
+            yield Path(file_path).stem, json_data
+
+    def _list_object_files(self, objects_folder, extension):
+        try:
+            directory_entries = sorted(os.scandir(objects_folder), key=lambda path: path.name)
+        except OSError:
+            return None
+        return [x.path for x in directory_entries if x.is_file() and x.name.endswith(extension)]
+
+    def _prepare(self, key, factory):
+        if self.preparation_cache is None:
+            return factory()
+        return self.preparation_cache.get(key, factory)
+
+    def _read_file(self, file_path, mode='r'):
+        return self._prepare(('file', str(file_path), mode), lambda: self._read_file_content(file_path, mode))
+
+    def _read_file_content(self, file_path, mode):
+        with open(file_path, mode) as file:
+            return file.read()
+
+    def _load_objects(self, objects_folder):
+        return dict(self._iter_objects(objects_folder))
+
+    def _render(self, text):
+        return self.placeholder_pattern.sub(self._render_placeholder, text)
+
+    def _render_placeholder(self, match):
+        # empty properties are substituted, only undefined ones leave the placeholder
+        value = self.properties.get(match.group(1))
+        if value is None:
+            self.logger.debug('Property {} is not defined, placeholder left as is', match.group(1))
+            return match.group(0)
+        return str(value)
+
+    def _get_temp_dir(self):
+        if self.preparation_cache is not None:
+            return self.preparation_cache.get_temp_dir()
+        with self._temp_dir_lock:
+            if self.temp_dir is None:
+                self.temp_dir = tempfile.mkdtemp(prefix='sherpa-janssen-')
+                self.logger.trace('Created temp dir: {}', self.temp_dir)
+            return self.temp_dir
 
     def _list_folders_objs(self, path):
         return [folder for folder in Path(path).iterdir() if folder.is_dir()]
 
-    def _load_json(self, json_file):
-        json_data = json.load(json_file)
+    def _load_json(self, json_text):
+        json_data = json.loads(json_text)
         self.logger.trace('JSON definition: {}', json_data)
         return json_data
 
-    def _patch_objs(self, endpoint, scopes, objects_folder, inum_patch=True):
-        for file_path in self._get_files_path(objects_folder):
-            self.logger.debug('Processing file: {}', file_path)
-            with open(file_path) as json_file:
-                json_data = self._load_json(json_file)
-                inum = Path(file_path).stem
-                query_endpoint = '{}/{}'.format(endpoint, inum) if inum_patch else endpoint
-                self._execute_with_json_response('PATCH', query_endpoint, scopes, json_data)
+    def _import_config(self, endpoint, scopes, objects_folder):
+        summary = ImportSummary()
+        patches = self._load_objects(objects_folder)
+        if patches:
+            current_config = self._execute_with_json_response('GET', endpoint, scopes)
+            patch_operations = self._plan_config_patch(patches, current_config)
+            if patch_operations:
+                self._execute_with_json_response('PATCH', endpoint, scopes, patch_operations)
+            summary.add(endpoint, self.IMPORT_RESULTS['PATCH' if patch_operations else None])
+        self.metrics.record_summary(summary)
+        return summary
+
+    def _plan_config_patch(self, patches, current_config):
+        desired_config = current_config
+        for name, patch_operations in patches.items():
+            self.logger.trace('Applying patch file: {}', name)
+            try:
+                desired_config = self._apply_json_patch(desired_config, patch_operations)
+            except ValueError as e:
+                raise ValueError('Patch file {} can not be applied: {}'.format(name, e))
+        patch_operations = []
+        with self.metrics.phase('diffing'):
+            # the order of configuration lists is meaningful (e.g. keyAlgsAllowedForGeneration), reorders are patched
+            self._diff_json('', desired_config, current_config, patch_operations, remove_missing=True, ordered=True)
+        if patch_operations:
+            self.logger.debug('{} patch files merged into {} operations: {}', len(patches), len(patch_operations), patch_operations)
+        else:
+            self.logger.debug('Configuration is up to date, no PATCH needed')
+        return patch_operations
+
+    def _get_list_data(self, query_list):
+        if isinstance(query_list, list):
+            return query_list
+        query_list_data = query_list.get('data')
+        if query_list_data is None:
+            #Jans 1.1.5
+            query_list_data = query_list.get('entries')
+        return [] if query_list_data is None else query_list_data
 
     def _query_by_pattern(self, endpoint, scopes, key, key_val):
         query_endpoint = '{}?pattern={}'.format(endpoint,key_val)
         query_list = self._execute_with_json_response('GET', query_endpoint, scopes)
-        if not isinstance(query_list, list):
-            query_list_data = query_list.get('data')
-            if query_list_data is None:
-                #Jans 1.1.5
-                query_list_data = query_list.get('entries')
-        search_result_list = [] if query_list_data is None else [ x for x in query_list_data if x.get(key) == key_val]
+        search_result_list = [ x for x in self._get_list_data(query_list) if x.get(key) == key_val]
         return search_result_list
 
-    def _import_obj_by_key(self, endpoint, scopes, objects_folder, key='name'):
-        for file_path in self._get_files_path(objects_folder):
-            self.logger.debug('Processing file: {}', file_path)
-            with open(file_path) as json_file:
-                json_data = self._load_json(json_file)
-                key_val = json_data.get(key)
-                search_result_list = self._query_by_pattern(endpoint, scopes, key, key_val)
-                size_search_result_list = len(search_result_list)
-                if size_search_result_list == 0:
-                    self.logger.debug('POST obj {}', key_val)
-                    self._execute_with_json_response('POST', endpoint, scopes, json_data)
-                elif size_search_result_list == 1:
-                    self.logger.debug('PUT obj {}', key_val)
-                    entry = search_result_list[0]
-                    entry.update(json_data)
-                    self._execute_with_json_response('PUT', endpoint, scopes, entry)
-                else:
-                    dns_search_result_list = [x.get('inum') for x in search_result_list]
-                    error_msg = 'obj with {} {} is duplicated on Jans, entries on system: {}'.format(key, key_val, dns_search_result_list)
-                    self.logger.error(error_msg)
-                    raise ValueError(error_msg)
+    def _build_page_endpoint(self, endpoint, start_index):
+        return '{}?limit={}&startIndex={}'.format(endpoint, self.page_size, start_index)
+
+    def _has_next_page(self, query_list, page_size, start_index):
+        if isinstance(query_list, list) or page_size == 0:
+            # server does not support paging, the whole collection was returned
+            return False
+        total_entries = query_list.get('totalEntriesCount')
+        return page_size >= self.page_size if total_entries is None else start_index < total_entries
+
+    def _get_page_starts(self, query_list, first_page_size):
+        if isinstance(query_list, list) or first_page_size == 0:
+            return []
+        total_entries = query_list.get('totalEntriesCount')
+        # the server may cap the page size, so the following pages start at multiples of the first one
+        return None if total_entries is None else list(range(first_page_size, total_entries, first_page_size))
+
+    def _list_all(self, endpoint, scopes, max_in_flight=1, build_page_endpoint=None):
+        build_page_endpoint = build_page_endpoint or self._build_page_endpoint
+        query_list = self._execute_with_json_response('GET', build_page_endpoint(endpoint, 0), scopes)
+        entries = list(self._get_list_data(query_list))
+        page_starts = self._get_page_starts(query_list, len(entries))
+        if max_in_flight > 1 and page_starts is not None:
+            with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+                get_page = lambda start_index: self._execute_with_json_response('GET', build_page_endpoint(endpoint, start_index), scopes)
+                for query_list in executor.map(get_page, page_starts):
+                    entries.extend(self._get_list_data(query_list))
+        else:
+            page = entries
+            while self._has_next_page(query_list, len(page), len(entries)):
+                query_list = self._execute_with_json_response('GET', build_page_endpoint(endpoint, len(entries)), scopes)
+                page = self._get_list_data(query_list)
+                entries.extend(page)
+        self.logger.debug('Listed {} entries from {}', len(entries), endpoint)
+        return entries
+
+    def _build_index(self, endpoint, scopes, key):
+        index = {}
+        for entry in self._list_all(endpoint, scopes):
+            index.setdefault(entry.get(key), []).append(entry)
+        return index
+
+    def _import_obj_by_key(self, endpoint, scopes, objects_folder, key='name', use_index=False):
+        summary = ImportSummary()
+        has_changes, changed_objects = self._peek(self._iter_changed_objects(endpoint, scopes, objects_folder, key, summary))
+        index = self._build_index(endpoint, scopes, key) if use_index and has_changes else None
+        return self._run_incremental(endpoint, changed_objects, lambda name, json_data: self._import_object_by_key(endpoint, scopes, name, json_data, key, index), summary)
+
+    def _import_object_by_key(self, endpoint, scopes, name, json_data, key, index):
+        self.logger.debug('Processing object: {}', name)
+        key_val = json_data.get(key)
+        if index is None:
+            search_result_list = self._query_by_pattern(endpoint, scopes, key, key_val)
+        else:
+            search_result_list = index.get(key_val, [])
+        operation, payload = self._plan_import_by_key(key, key_val, json_data, search_result_list)
+        imported = payload
+        if operation is not None:
+            response = self._execute_with_json_response(operation, endpoint, scopes, payload)
+            imported = response if operation == 'POST' else payload
+        if index is not None:
+            index[key_val] = [imported]
+        self._on_object_imported(endpoint, imported)
+        return self.IMPORT_RESULTS[operation]
+
+    def _plan_import_by_key(self, key, key_val, json_data, search_result_list):
+        size_search_result_list = len(search_result_list)
+        if size_search_result_list == 0:
+            self.logger.debug('POST obj {}', key_val)
+            return 'POST', json_data
+        elif size_search_result_list == 1:
+            entry = search_result_list[0]
+            with self.metrics.phase('diffing'):
+                has_changes = self._diff_json('', json_data, entry, [])
+            if not has_changes:
+                self.logger.debug('obj {} is up to date, no PUT needed', key_val)
+                return None, entry
+            self.logger.debug('PUT obj {}', key_val)
+            entry.update(json_data)
+            return 'PUT', entry
+        else:
+            dns_search_result_list = [x.get('inum') for x in search_result_list]
+            error_msg = 'obj with {} {} is duplicated on Jans, entries on system: {}'.format(key, key_val, dns_search_result_list)
+            self.logger.error(error_msg)
+            raise ValueError(error_msg)
+
+    def _on_object_imported(self, endpoint, json_obj):
+        if endpoint == '/jans-config-api/api/v1/scopes':
+            self._cache_scope_dn(json_obj)
 
     def _import_obj_by_inum(self, endpoint, scopes, objects_folder):
-        for file_path in self._get_files_path(objects_folder):
-            self.logger.debug('Processing file: {}', file_path)
-            with open(file_path) as json_file:
-                json_data = self._load_json(json_file)
-                inum = json_data.get('inum')
-                query_endpoint = self._build_query_endpoint(endpoint, inum)
-                json_data = self._customize_for_endpoint(endpoint, objects_folder, file_path, json_data)
-                current_jans_obj = {}
-                try:
-                    self.logger.debug('GETting object: {}', query_endpoint)
-                    current_jans_obj = self._execute_with_json_response('GET', query_endpoint, scopes)
-                except:
-                    self.logger.debug("Object {} not present in jans", query_endpoint)
-                if current_jans_obj != {}:
-                    self.logger.debug('Object already exists. Starting update process.')
-                    patch_operations = self._get_patch_operations(endpoint, json_data, current_jans_obj)
-                    if len(patch_operations) > 0:
-                        self.logger.debug('The operations patch is {}', patch_operations)
-                        self._execute_with_json_response('PATCH', endpoint+"/"+inum, scopes, patch_operations)
-                    else:
-                        self.logger.debug('No patch operations needed.')
-                else:
-                    self.logger.debug('POSTing object: {} to endpoint: {}', json_data, endpoint)
-                    self._execute_with_json_response('POST', endpoint, scopes, json_data)
+        summary = ImportSummary()
+        if endpoint == '/jans-config-api/api/v1/openid/clients':
+            self._validate_client_scopes(self._iter_objects_to_validate(endpoint, objects_folder))
+        changed_objects = self._iter_changed_objects(endpoint, scopes, objects_folder, 'inum', summary)
+        return self._run_incremental(endpoint, changed_objects, lambda name, json_data: self._import_object_by_inum(endpoint, scopes, objects_folder, name, json_data), summary)
+
+    def _hash_object(self, endpoint, objects_folder, name, json_data):
+        content_hash = hashlib.sha256(json.dumps(json_data, sort_keys=True).encode())
+        if endpoint == '/jans-config-api/api/v1/config/scripts':
+            code_file_path = '{}/{}.py'.format(objects_folder, name)
+            if os.path.isfile(code_file_path):
+                content_hash.update(b'\0')
+                content_hash.update(self._read_file(code_file_path, 'rb'))
+        return content_hash.hexdigest()
+
+    def _is_unchanged(self, endpoint, name, content_hash):
+        return self.incremental and not self.full and self.state.get(endpoint, name) == content_hash
+
+    def _iter_changed_objects(self, endpoint, scopes, objects_folder, key, summary, server_index=None):
+        # objects are loaded, hashed and checked one at a time while the previous ones are being imported
+        for name, json_data in self._iter_objects(objects_folder):
+            content_hash = self._hash_object(endpoint, objects_folder, name, json_data)
+            if self._is_unchanged(endpoint, name, content_hash):
+                if self.detect_drift and server_index is None:
+                    server_index = self._build_index(endpoint, scopes, key)
+                if not (self.detect_drift and self._is_drifted(endpoint, objects_folder, key, name, json_data, server_index)):
+                    self.logger.debug('{} is unchanged since last deploy, skipping', name)
+                    summary.add(name, 'skipped')
+                    continue
+            yield name, (json_data, content_hash)
+
+    def _iter_objects_to_validate(self, endpoint, objects_folder):
+        # with detect_drift unchanged objects may be imported too, so all of them are validated
+        for name, json_data in self._iter_objects(objects_folder):
+            if self.detect_drift or not self._is_unchanged(endpoint, name, self._hash_object(endpoint, objects_folder, name, json_data)):
+                yield json_data
 
-    def _import_agama_projects(self, endpoint, scopes, objects_folder, wait_time):
+    def _is_drifted(self, endpoint, objects_folder, key, name, json_data, server_index):
+        json_data = copy.deepcopy(json_data)
+        search_result_list = server_index.get(json_data.get(key), [])
+        try:
+            json_data = self._customize_for_endpoint(endpoint, objects_folder, name, json_data)
+            drifted = len(search_result_list) != 1 or len(self._get_patch_operations(endpoint, json_data, dict(search_result_list[0]))) > 0
+        except ValueError:
+            drifted = True
+        if drifted:
+            self.logger.debug('{} drifted on Jans since last deploy', name)
+        return drifted
+
+    def _peek(self, items):
+        first_item = next(items, None)
+        if first_item is None:
+            return False, iter(())
+        return True, itertools.chain([first_item], items)
+
+    def _run_incremental(self, endpoint, changed_objects, pipeline, summary):
+        def apply(name, item):
+            json_data, content_hash = item
+            try:
+                result = pipeline(name, json_data)
+            except Exception:
+                self.state.remove(endpoint, name)
+                raise
+            self.state.set(endpoint, name, content_hash)
+            return result
+        try:
+            return self._run_pipelines(changed_objects, apply, summary=summary)
+        finally:
+            if self.incremental:
+                self.state.save()
+
+    def _import_object_by_inum(self, endpoint, scopes, objects_folder, name, json_data):
+        self.logger.debug('Processing object: {}', name)
+        inum = json_data.get('inum')
+        query_endpoint = self._build_query_endpoint(endpoint, inum)
+        json_data = self._customize_for_endpoint(endpoint, objects_folder, name, json_data)
+        current_jans_obj = {}
+        try:
+            self.logger.debug('GETting object: {}', query_endpoint)
+            current_jans_obj = self._execute_with_json_response('GET', query_endpoint, scopes)
+        except:
+            self.logger.debug("Object {} not present in jans", query_endpoint)
+        operation, payload = self._plan_import_by_inum(endpoint, json_data, current_jans_obj)
+        if operation == 'PATCH':
+            self._execute_with_json_response('PATCH', endpoint+"/"+inum, scopes, payload)
+        elif operation == 'POST':
+            self._execute_with_json_response('POST', endpoint, scopes, payload)
+        return self.IMPORT_RESULTS[operation]
+
+    def _plan_import_by_inum(self, endpoint, json_data, current_jans_obj):
+        if current_jans_obj != {}:
+            self.logger.debug('Object already exists. Starting update process.')
+            patch_operations = self._get_patch_operations(endpoint, json_data, current_jans_obj)
+            if len(patch_operations) > 0:
+                self.logger.debug('The operations patch is {}', patch_operations)
+                return 'PATCH', patch_operations
+            self.logger.debug('No patch operations needed.')
+            return None, None
+        self.logger.debug('POSTing object: {} to endpoint: {}', json_data, endpoint)
+        return 'POST', json_data
+
+    def _run_pipelines(self, items, pipeline, max_in_flight=None, summary=None):
+        max_in_flight = self.max_in_flight if max_in_flight is None else max_in_flight
+        summary = ImportSummary() if summary is None else summary
+        items = items.items() if isinstance(items, dict) else items
+        if max_in_flight <= 1:
+            try:
+                for name, item in items:
+                    summary.add(name, pipeline(name, item))
+            finally:
+                self.metrics.record_summary(summary)
+            return summary
+        self.logger.debug('Processing objects with up to {} in flight', max_in_flight)
+        # items are submitted as earlier ones complete, so only a window of them is loaded at a time
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            try:
+                for name, item in items:
+                    pending.append((name, executor.submit(self._run_buffered_pipeline, pipeline, name, item)))
+                    if len(pending) >= max_in_flight * 2:
+                        self._collect_pipeline(summary, *pending.popleft())
+            finally:
+                while pending:
+                    self._collect_pipeline(summary, *pending.popleft())
+        self.metrics.record_summary(summary)
+        self.logger.debug('Import summary: {}', summary)
+        if summary.errors:
+            raise ConfigAPIImportError(summary)
+        return summary
+
+    def _collect_pipeline(self, summary, name, future):
+        # logs are replayed in file order, so the output is the same on every run
+        result, error, records = future.result()
+        self.logger.replay(records)
+        if error is None:
+            summary.add(name, result)
+        else:
+            self.logger.error('Processing {} failed: {}', name, error)
+            summary.add_error(name, error)
+
+    def _run_buffered_pipeline(self, pipeline, name, item):
+        with self.logger.buffered() as records:
+            try:
+                return pipeline(name, item), None, records
+            except Exception as e:
+                return None, e, records
+
+    def _import_agama_projects(self, endpoint, scopes, objects_folder, wait_time, force):
         self.logger.debug("starting agama project import")
         folders_objs = self._list_folders_objs(objects_folder)
         self.logger.trace("folders: {}", folders_objs)
-        self.logger.trace("Get configs and build zip files for deploy")
-        agama_scripts_configs = []
-        for folder in folders_objs:
-            folder_name = folder.name
-            folder_path = str(folder)
-
-            project_json_file_path = "{}/{}".format(folder_path,'project.json')
-            with open(project_json_file_path) as json_file:
-                self.logger.trace("Extracting project_json for {}", folder_name)
-                project_json_obj = self._load_json(json_file)
-                self.logger.trace("config for {} is: {}", folder_name, json.dumps(project_json_obj))
-                agama_scripts_configs.append(project_json_obj)
-            agama_project_name = project_json_obj.get("projectName")
-
-            self.logger.trace("building zip file for: {}", folder_name)
-            zip_file_path = "{}/{}.zip".format(self.temp_dir, folder_name)
-            with zipfile.ZipFile(zip_file_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, dirs, files in os.walk(folder_path):
-                    dirs[:] = [d for d in dirs if not d.startswith('.')] # magic that removes hidden folders
-                    for file in files:
-                        file_path = Path(root) / file
-                        zipf.write(file_path, file_path.relative_to(folder_path))
-            self.logger.trace("ZIP agama file created for: {}", folder_name)
-
-            self.logger.trace("POST agama project {}", agama_project_name)
-            self._execute_with_json_response('POST', "{}/{}".format(endpoint, agama_project_name), scopes, zip_file_path)
-
-        self.logger.trace("All agama projects posted, wait time until proceed with configs is: {} secs", wait_time)
-        time.sleep(wait_time)
-
-        self.logger.trace("Proceed with PUT configs for agama projects")
-        for agama_script_config in agama_scripts_configs:
-            agama_project_name = agama_script_config.get("projectName")
-            configs = agama_script_config.get('configs')
-            self._execute_with_json_response('PUT', "{}/configs/{}".format(endpoint, agama_project_name), scopes, configs)
-
+        try:
+            folders = {folder.name: folder for folder in folders_objs}
+            summary = self._run_pipelines(folders, lambda name, folder: self._import_agama_project(endpoint, scopes, folder, wait_time, force), self.agama_max_in_flight)
+        finally:
+            self.state.save()
         self.logger.debug("Agama projects imported successfully")
+        return summary
+
+    def _import_agama_project(self, endpoint, scopes, folder, wait_time, force):
+        project_json_obj, project_files, content_hash = self._prepare_agama_project(folder)
+        agama_project_name = project_json_obj.get("projectName")
+        if not (force or self.full) and self._is_agama_project_unchanged(endpoint, scopes, agama_project_name, content_hash):
+            self.logger.debug("Agama project {} is unchanged, skipping deployment", agama_project_name)
+            return 'unchanged'
+        zip_file_path = self._get_agama_zip(folder, project_files)
+        self.logger.trace("POST agama project {}", agama_project_name)
+        self._execute_with_json_response('POST', "{}/{}".format(endpoint, agama_project_name), scopes, zip_file_path)
+        self._wait_agama_deployment(endpoint, scopes, agama_project_name, wait_time)
+        self.logger.trace("PUT configs for agama project {}", agama_project_name)
+        configs = project_json_obj.get('configs')
+        self._execute_with_json_response('PUT', "{}/configs/{}".format(endpoint, agama_project_name), scopes, configs)
+        self.state.set('agama', agama_project_name, content_hash)
+        return 'deployed'
+
+    def _is_agama_project_unchanged(self, endpoint, scopes, agama_project_name, content_hash):
+        if self.state.get('agama', agama_project_name) != content_hash:
+            return False
+        # the hash was applied before, make sure the project is still deployed on Jans
+        try:
+            deployment = self._execute_with_json_response('GET', "{}/{}".format(endpoint, agama_project_name), scopes)
+            return self._is_agama_deployed(agama_project_name, deployment)
+        except Exception as e:
+            self.logger.debug("Agama project {} is not deployed: {}", agama_project_name, e)
+            return False
+
+    def _wait_agama_deployment(self, endpoint, scopes, agama_project_name, wait_time):
+        with self.metrics.phase('agama_waiting'):
+            return self._poll_agama_deployment(endpoint, scopes, agama_project_name, wait_time)
+
+    def _poll_agama_deployment(self, endpoint, scopes, agama_project_name, wait_time):
+        self.logger.trace("Waiting up to {} secs for agama project {} deployment", wait_time, agama_project_name)
+        deadline = time.monotonic() + wait_time
+        delay = self.agama_poll_interval
+        while True:
+            deployment = self._execute_with_json_response('GET', "{}/{}".format(endpoint, agama_project_name), scopes)
+            if self._is_agama_deployed(agama_project_name, deployment):
+                return deployment
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError('Agama project {} was not deployed after {} secs'.format(agama_project_name, wait_time))
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, self.max_backoff)
+
+    def _is_agama_deployed(self, agama_project_name, deployment):
+        # Jans answers 204 (empty body) while the deployment task is running
+        if not deployment or not deployment.get('finishedAt'):
+            self.logger.trace("Agama project {} deployment in progress", agama_project_name)
+            return False
+        error = (deployment.get('details') or {}).get('error')
+        if error:
+            raise ValueError('Agama project {} deployment failed: {}'.format(agama_project_name, error))
+        self.logger.debug("Agama project {} deployed at {}", agama_project_name, deployment.get('finishedAt'))
+        return True
+
+    def _prepare_agama_project(self, folder):
+        return self._prepare(('agama', str(folder)), lambda: self._load_agama_project_files(folder))
+
+    def _load_agama_project_files(self, folder):
+        project_files = self._list_agama_project_files(folder)
+        return self._load_agama_project(folder), project_files, self._hash_agama_project(project_files)
+
+    def _get_agama_zip(self, folder, project_files):
+        return self._prepare(('agama-zip', str(folder)), lambda: self._build_agama_zip(folder, project_files))
+
+    def _load_agama_project(self, folder):
+        project_json_file_path = "{}/{}".format(str(folder),'project.json')
+        with open(project_json_file_path) as json_file:
+            self.logger.trace("Extracting project_json for {}", folder.name)
+            project_json_obj = self._load_json(json_file.read())
+            self.logger.trace("config for {} is: {}", folder.name, json.dumps(project_json_obj))
+        return project_json_obj
+
+    def _list_agama_project_files(self, folder):
+        project_files = []
+        for root, dirs, files in os.walk(str(folder)):
+            dirs[:] = [d for d in dirs if not d.startswith('.')] # magic that removes hidden folders
+            for file in files:
+                file_path = Path(root) / file
+                project_files.append((file_path.relative_to(folder).as_posix(), file_path))
+        return sorted(project_files)
+
+    def _hash_agama_project(self, project_files):
+        content_hash = hashlib.sha256()
+        for arcname, file_path in project_files:
+            content_hash.update(arcname.encode())
+            content_hash.update(b'\0')
+            with open(file_path, 'rb') as file:
+                for chunk in iter(lambda: file.read(65536), b''):
+                    content_hash.update(chunk)
+            content_hash.update(b'\0')
+        return content_hash.hexdigest()
+
+    def _build_agama_zip(self, folder, project_files):
+        folder_name = folder.name
+        self.logger.trace("building zip file for: {}", folder_name)
+        zip_file_path = "{}/{}.zip".format(self._get_temp_dir(), folder_name)
+        # fixed timestamps and permissions, sorted entries: same project files always produce the same zip file
+        with self.metrics.phase('zipping'), zipfile.ZipFile(zip_file_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for arcname, file_path in project_files:
+                zip_info = zipfile.ZipInfo(arcname, date_time=(1980, 1, 1, 0, 0, 0))
+                zip_info.compress_type = zipfile.ZIP_DEFLATED
+                zip_info.external_attr = 0o644 << 16
+                with open(file_path, 'rb') as source, zipf.open(zip_info, 'w') as target:
+                    shutil.copyfileobj(source, target)
+        self.logger.trace("ZIP agama file created for: {}", folder_name)
+        return zip_file_path
 
     def _get_patch_operations(self, endpoint, json_data, current_jans_obj):
         self.logger.debug('JSON from file: {}', json_data)
@@ -214,19 +1285,166 @@ class ConfigAPIClient:
             json_data.pop("clientSecret", None)
             current_jans_obj.pop("clientSecret", None)
 
-        for attributeName, attributeValue in json_data.items():
-            self.logger.debug('Attr {} with Value {} Type {}', attributeName, attributeValue, type(attributeValue))
-            if current_jans_obj[attributeName] != attributeValue:
-                if type(attributeValue) is dict:
-                    for childName, childValue in json_data["attributes"].items():
-                        self.logger.debug('Attributes section. Key {} Value {}', childName, childValue)
-                        op = dict(op="replace", path="/"+attributeName+"/"+childName, value=childValue)
-                        patch_operations.append(op)
+        with self.metrics.phase('diffing'):
+            self._diff_json('', json_data, current_jans_obj, patch_operations)
+        return patch_operations
+
+############################
+# JSON Patch (RFC 6902) diff and apply
+#
+# Operations are emitted at the deepest differing path. Keys missing on the desired object are left as they
+# are unless remove_missing=True. Lists are compared as multisets (Jans does not keep the order of
+# redirectUris, scopes, grantTypes, etc.) unless ordered=True, appended/removed tails produce add/remove operations, same size
+# lists whose items all contain the desired items are left as they are (Jans adds keys like hide to script
+# properties), otherwise they are diffed item by item (keys missing on a desired item are removed) and any other
+# change replaces the whole list.
+# Patches are applied leniently: replace of a missing key adds it and remove of a missing key is ignored,
+# since both leave the object in the state the patch asks for.
+############################
+
+    def _diff_json(self, path, desired, current, patch_operations, remove_missing=False, ordered=False):
+        if isinstance(desired, dict) and isinstance(current, dict):
+            for key, value in desired.items():
+                child_path = '{}/{}'.format(path, self._escape_json_pointer(key))
+                if key not in current:
+                    patch_operations.append(dict(op="add", path=child_path, value=value))
                 else:
-                    op = dict(op="replace", path="/"+attributeName, value=attributeValue)
-                    patch_operations.append(op)
+                    self._diff_json(child_path, value, current[key], patch_operations, remove_missing, ordered)
+            if remove_missing:
+                for key in current:
+                    if key not in desired:
+                        patch_operations.append(dict(op="remove", path='{}/{}'.format(path, self._escape_json_pointer(key))))
+        elif isinstance(desired, list) and isinstance(current, list):
+            self._diff_json_list(path, desired, current, patch_operations, remove_missing, ordered)
+        elif desired != current or isinstance(desired, bool) != isinstance(current, bool):
+            patch_operations.append(dict(op="replace", path=path, value=desired))
         return patch_operations
 
+    def _diff_json_list(self, path, desired, current, patch_operations, remove_missing, ordered):
+        if self._same_items(desired, current, ordered):
+            return
+        size = min(len(desired), len(current))
+        if len(desired) > len(current) and self._same_items(desired[:size], current, ordered):
+            for value in desired[size:]:
+                patch_operations.append(dict(op="add", path='{}/-'.format(path), value=value))
+        elif len(desired) < len(current) and self._same_items(desired, current[:size], ordered):
+            # remove from the end so the remaining indexes stay valid
+            for index in reversed(range(size, len(current))):
+                patch_operations.append(dict(op="remove", path='{}/{}'.format(path, index)))
+        elif len(desired) == len(current) and all(isinstance(x, (dict, list)) for x in desired + current):
+            if self._contains_items(desired, current, ordered):
+                return
+            # items are matched by position, so keys of the current item are not kept (it may be another item)
+            for index, (desired_item, current_item) in enumerate(zip(desired, current)):
+                self._diff_json('{}/{}'.format(path, index), desired_item, current_item, patch_operations, True, ordered)
+        else:
+            patch_operations.append(dict(op="replace", path=path, value=desired))
+
+    def _contains_items(self, desired, current, ordered=False):
+        # each desired item must match a distinct current item on the desired item keys, server only keys are ignored
+        if ordered:
+            return all(not self._diff_json('', x, y, [], False, ordered) for x, y in zip(desired, current))
+        unmatched = list(current)
+        for desired_item in desired:
+            match = next((x for x in unmatched if not self._diff_json('', desired_item, x, [], False, ordered)), None)
+            if match is None:
+                return False
+            unmatched.remove(match)
+        return True
+
+    def _same_items(self, desired, current, ordered=False):
+        if len(desired) != len(current):
+            return False
+        desired_items = [json.dumps(x, sort_keys=True) for x in desired]
+        current_items = [json.dumps(x, sort_keys=True) for x in current]
+        if ordered:
+            return desired_items == current_items
+        return sorted(desired_items) == sorted(current_items)
+
+    def _escape_json_pointer(self, key):
+        return str(key).replace('~', '~0').replace('/', '~1')
+
+    def _apply_json_patch(self, json_data, patch_operations):
+        if not isinstance(patch_operations, list):
+            raise ValueError('JSON Patch must be a list of operations')
+        json_data = copy.deepcopy(json_data)
+        for patch_operation in patch_operations:
+            op = patch_operation.get('op')
+            path = patch_operation.get('path')
+            if op in ('add', 'replace'):
+                json_data = self._set_json_pointer(json_data, path, copy.deepcopy(patch_operation.get('value')), op == 'add')
+            elif op == 'remove':
+                json_data = self._remove_json_pointer(json_data, path)
+            elif op in ('move', 'copy'):
+                value = copy.deepcopy(self._get_json_pointer(json_data, patch_operation.get('from')))
+                if op == 'move':
+                    json_data = self._remove_json_pointer(json_data, patch_operation.get('from'))
+                json_data = self._set_json_pointer(json_data, path, value, True)
+            elif op == 'test':
+                if self._get_json_pointer(json_data, path) != patch_operation.get('value'):
+                    raise ValueError('test failed at {}'.format(path))
+            else:
+                raise ValueError('unsupported operation {}'.format(op))
+        return json_data
+
+    def _split_json_pointer(self, path):
+        if path is None or (path and not path.startswith('/')):
+            raise ValueError('invalid path {}'.format(path))
+        return [x.replace('~1', '/').replace('~0', '~') for x in path.split('/')[1:]]
+
+    def _get_json_pointer(self, json_data, path):
+        for token in self._split_json_pointer(path):
+            json_data = self._get_json_child(json_data, token, path)
+        return json_data
+
+    def _get_json_child(self, json_data, token, path):
+        try:
+            if isinstance(json_data, list):
+                return json_data[int(token)]
+            return json_data[token]
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise ValueError('path {} does not exist'.format(path))
+
+    def _get_json_parent(self, json_data, path):
+        tokens = self._split_json_pointer(path)
+        parent = json_data
+        for token in tokens[:-1]:
+            parent = self._get_json_child(parent, token, path)
+        return parent, tokens[-1] if tokens else None
+
+    def _set_json_pointer(self, json_data, path, value, insert):
+        parent, token = self._get_json_parent(json_data, path)
+        if token is None:
+            return value
+        if isinstance(parent, list):
+            index = len(parent) if token == '-' else self._get_json_index(parent, token, path, insert)
+            if insert:
+                parent.insert(index, value)
+            else:
+                parent[index] = value
+        elif isinstance(parent, dict):
+            parent[token] = value
+        else:
+            raise ValueError('path {} does not exist'.format(path))
+        return json_data
+
+    def _remove_json_pointer(self, json_data, path):
+        parent, token = self._get_json_parent(json_data, path)
+        if token is None:
+            raise ValueError('can not remove the whole document')
+        if isinstance(parent, list):
+            del parent[self._get_json_index(parent, token, path, False)]
+        elif isinstance(parent, dict):
+            parent.pop(token, None)
+        else:
+            raise ValueError('path {} does not exist'.format(path))
+        return json_data
+
+    def _get_json_index(self, json_list, token, path, insert):
+        if not token.isdigit() or int(token) > len(json_list) or (int(token) == len(json_list) and not insert):
+            raise ValueError('index {} out of range'.format(path))
+        return int(token)
+
     def _build_query_endpoint(self, endpoint, inum):
         if endpoint == '/jans-config-api/api/v1/config/scripts':
             query_endpoint = '{}/inum/{}'.format(endpoint, inum)
@@ -234,28 +1452,72 @@ class ConfigAPIClient:
             query_endpoint = '{}/{}'.format(endpoint, inum)
         return query_endpoint
 
-    def _customize_for_endpoint(self, endpoint, objects_folder, file_path, json_data):
+    def _customize_for_endpoint(self, endpoint, objects_folder, name, json_data):
         if endpoint == '/jans-config-api/api/v1/config/scripts':
             self.logger.debug('loading script code into json object')
-            code_file_path = '{}/{}.py'.format(objects_folder, Path(file_path).stem)
-            with open(code_file_path) as code_file:
-                json_data['script'] = code_file.read()
+            code_file_path = '{}/{}.py'.format(objects_folder, name)
+            json_data['script'] = self._read_file(code_file_path)
         if endpoint == '/jans-config-api/api/v1/openid/clients':
             self.logger.debug('loading scopes inum on client')
             client_scopes = json_data.get('scopes')
             if client_scopes:
                 id_scopes = [x for x in client_scopes if not x.startswith("inum=")]
                 #If scope id does not exist, must stop the whole operation
-                for id_scope in id_scopes:
-                    search_result_list = self._query_by_pattern('/jans-config-api/api/v1/scopes', 'https://jans.io/oauth/config/scopes.readonly', 'id', id_scope)
-                    self.logger.trace("replacing scope id {} ", id_scope)
-                    self.logger.trace("search_result_list: {}",search_result_list)
-                    inum = search_result_list[0].get('dn')
-                    client_scopes.append(inum)
-                    client_scopes.remove(id_scope)
-                    self.logger.trace("replaced with scope inum {} ", inum)
+                unknown_scopes = self._resolve_scope_ids(id_scopes)
+                if unknown_scopes:
+                    raise ValueError('Scopes {} do not exist on Jans'.format(unknown_scopes))
+                json_data['scopes'] = [self.scope_dns.get(x, x) for x in client_scopes]
+                self.logger.trace("replaced scope ids with scope inums: {}", json_data['scopes'])
         return json_data
 
+    def _cache_scope_dn(self, scope):
+        scope_id = scope.get('id')
+        scope_dn = scope.get('dn')
+        if scope_id and scope_dn:
+            with self._scope_dns_lock:
+                self.scope_dns[scope_id] = scope_dn
+
+    def warm_scope_cache(self):
+        self.logger.debug('Loading scope ids cache')
+        for scope in self._list_all('/jans-config-api/api/v1/scopes', 'https://jans.io/oauth/config/scopes.readonly'):
+            self._cache_scope_dn(scope)
+
+    def _resolve_scope_ids(self, scope_ids):
+        unknown_scopes = []
+        for scope_id in self._get_uncached_scope_ids(scope_ids):
+            search_result_list = self._query_by_pattern('/jans-config-api/api/v1/scopes', 'https://jans.io/oauth/config/scopes.readonly', 'id', scope_id)
+            if not self._cache_scope_search(scope_id, search_result_list):
+                unknown_scopes.append(scope_id)
+        return unknown_scopes
+
+    def _get_uncached_scope_ids(self, scope_ids):
+        return [x for x in dict.fromkeys(scope_ids) if x not in self.scope_dns]
+
+    def _cache_scope_search(self, scope_id, search_result_list):
+        # returns False when the scope id does not exist in Jans
+        self.logger.trace("search_result_list for scope id {}: {}", scope_id, search_result_list)
+        if not search_result_list:
+            return False
+        self._cache_scope_dn(search_result_list[0])
+        return True
+
+    def _get_client_scope_ids(self, clients):
+        scope_ids = []
+        for client in clients:
+            client_scopes = client.get('scopes') or []
+            scope_ids.extend([x for x in client_scopes if not x.startswith("inum=")])
+        return scope_ids
+
+    def _validate_client_scopes(self, clients):
+        unknown_scopes = self._resolve_scope_ids(self._get_client_scope_ids(clients))
+        self._check_unknown_scopes(unknown_scopes)
+
+    def _check_unknown_scopes(self, unknown_scopes):
+        if unknown_scopes:
+            error_msg = 'Scopes referenced by clients do not exist on Jans: {}'.format(unknown_scopes)
+            self.logger.error(error_msg)
+            raise ValueError(error_msg)
+
     def _clean_json(self, endpoint, json_obj):
         if endpoint == '/jans-config-api/api/v1/openid/clients':
             self._pop_if_not_str(json_obj, ['clientName', 'logoUri', 'clientUri', 'policyUri', 'tosUri'])
@@ -271,13 +1533,14 @@ class ConfigAPIClient:
 # Gluu searchs entries by displayName/description substring.
 # If there is more than one valid value for displayName
 # Always take the obj which name attr is equal to the json file value.
+# use_index=True pages through all attributes once instead of one search per file.
 ############################
 
-    def import_attributes(self, objects_folder):
+    def import_attributes(self, objects_folder, use_index=False):
         self.logger.debug('Import attributes from {}', objects_folder)
         endpoint = '/jans-config-api/api/v1/attributes'
         scopes = 'https://jans.io/oauth/config/attributes.readonly https://jans.io/oauth/config/attributes.write'
-        self._import_obj_by_key(endpoint, scopes, objects_folder)
+        return self._import_obj_by_key(endpoint, scopes, objects_folder, use_index=use_index)
 
 ############################
 # scopes operations
@@ -286,38 +1549,44 @@ class ConfigAPIClient:
 # Gluu searchs entries by displayName/description substring.
 # If there is more than one valid value for displayName
 # Always take the obj which name attr is equal to the json file value.
+# use_index=True pages through all scopes once instead of one search per file.
 ############################
 
     def get_scope(self, inum):
         self.logger.debug('Getting scope {}', inum)
-        endpoint = '/jans-config-api/api/v1/scopes' + inum
+        endpoint = '/jans-config-api/api/v1/scopes/' + inum
         scopes = 'https://jans.io/oauth/config/scopes.readonly'
-        self._get_object(endpoint, scopes)
+        return self._get_object(endpoint, scopes)
 
-    def import_scopes(self, objects_folder):
+    def import_scopes(self, objects_folder, use_index=False):
         self.logger.debug('Import scopes from {}', objects_folder)
         endpoint = '/jans-config-api/api/v1/scopes'
         scopes = 'https://jans.io/oauth/config/scopes.write https://jans.io/oauth/config/scopes.readonly'
-        self._import_obj_by_key(endpoint, scopes, objects_folder, 'id')
+        return self._import_obj_by_key(endpoint, scopes, objects_folder, 'id', use_index)
 
 ############################
 # Client operations
 #
 # requires inum attr defined on the json file
 # scopes can be a valid inum, or the scope id value (this value also must be defined on scope displayName definition)
+# scope ids are resolved once per client instance; scopes imported with import_scopes are resolved without queries.
+# prefetch_scopes=True loads every scope id with a single paged listing.
+# All scope ids are validated before importing any client.
 ############################
 
     def get_client(self, inum):
         self.logger.debug('Getting client {}', inum)
         endpoint = '/jans-config-api/api/v1/openid/clients/' + inum
         scopes = 'https://jans.io/oauth/config/openid/clients.readonly'
-        self._get_object(endpoint, scopes)
+        return self._get_object(endpoint, scopes)
 
-    def import_clients(self, objects_folder):
+    def import_clients(self, objects_folder, prefetch_scopes=False):
         self.logger.debug('Import clients from {}', objects_folder)
         endpoint = '/jans-config-api/api/v1/openid/clients'
         scopes = 'https://jans.io/oauth/config/openid/clients.readonly https://jans.io/oauth/config/openid/clients.write'
-        self._import_obj_by_inum(endpoint, scopes, objects_folder)
+        if prefetch_scopes:
+            self.warm_scope_cache()
+        return self._import_obj_by_inum(endpoint, scopes, objects_folder)
 
 ############################
 # Script operations
@@ -332,7 +1601,7 @@ class ConfigAPIClient:
         self.logger.debug('Import Script from {}', objects_folder)
         endpoint = '/jans-config-api/api/v1/config/scripts'
         scopes = 'https://jans.io/oauth/config/scripts.readonly https://jans.io/oauth/config/scripts.write'
-        self._import_obj_by_inum(endpoint, scopes, objects_folder)
+        return self._import_obj_by_inum(endpoint, scopes, objects_folder)
 
 ############################
 # agama scripts operations
@@ -340,55 +1609,150 @@ class ConfigAPIClient:
 # folder structure must respect https://docs.jans.io/v1.1.5/agama/gama-format/
 # project.json must have config section (can be empty) it is required to PUT step on function
 # Agama projects takes 30 secs to reload average after modification
+# projects are zipped and deployed in parallel (configapi_agama_max_in_flight), each project deployment
+# status is polled and its configs are PUT as soon as it is deployed. wait_time is the max wait per project.
+# projects whose content hash matches the last one applied to the host (configapi_state_file) and that are
+# still deployed are skipped, force=True deploys every project.
 ############################
 
-    def import_agama_scripts(self, objects_folder, wait_time=30):
+    def import_agama_scripts(self, objects_folder, wait_time=300, force=False):
         self.logger.debug('Import Agama Script from {}', objects_folder)
         endpoint = '/jans-config-api/api/v1/agama-deployment'
         scopes = 'https://jans.io/oauth/config/agama.readonly https://jans.io/oauth/config/agama.write https://jans.io/oauth/config/agama.delete'
-        self._import_agama_projects(endpoint, scopes, objects_folder, wait_time)
+        return self._import_agama_projects(endpoint, scopes, objects_folder, wait_time, force)
 
 ############################
 # jans modules configuration
+#
+# each file in the import folder is a JSON Patch. The current configuration is fetched once, every patch file is
+# applied locally in file name order and only the net difference is sent, in a single PATCH (none when the
+# configuration is already up to date), so the module reloads its configuration at most once per import.
 ############################
 
     def get_auth_server_config(self):
         self.logger.debug('Getting auth-server config')
         endpoint = '/jans-config-api/api/v1/jans-auth-server/config'
         scopes = 'https://jans.io/oauth/jans-auth-server/config/properties.readonly'
-        self._get_object(endpoint, scopes)
+        return self._get_object(endpoint, scopes)
 
 
     def import_auth_server_config(self, objects_folder):
         self.logger.debug('Patch auth-server configuration from {}', objects_folder)
         endpoint = '/jans-config-api/api/v1/jans-auth-server/config'
         scopes = 'https://jans.io/oauth/jans-auth-server/config/properties.readonly https://jans.io/oauth/jans-auth-server/config/properties.write'
-        self._patch_objs(endpoint, scopes, objects_folder, False)
+        return self._import_config(endpoint, scopes, objects_folder)
 
 
     def get_config_api_config(self):
         self.logger.debug('Getting config-api config')
         endpoint = '/jans-config-api/api/v1/api-config'
         scopes = 'https://jans.io/oauth/config/properties.readonly'
-        self._get_object(endpoint, scopes)
+        return self._get_object(endpoint, scopes)
 
 
     def import_config_api_config(self, objects_folder):
         self.logger.debug('Patch config-api configuration from {}', objects_folder)
         endpoint = '/jans-config-api/api/v1/api-config'
         scopes = 'https://jans.io/oauth/config/properties.readonly https://jans.io/oauth/config/properties.write'
-        self._patch_objs(endpoint, scopes, objects_folder, False)
+        return self._import_config(endpoint, scopes, objects_folder)
 
 
     def get_scim_config(self):
         self.logger.debug('Getting scim config')
         endpoint = '/jans-config-api/scim/scim-config'
         scopes = 'https://jans.io/scim/config.readonly'
-        self._get_object(endpoint, scopes)
+        return self._get_object(endpoint, scopes)
 
 
     def import_scim_config(self, objects_folder):
         self.logger.debug('Patch scim configuration from {}', objects_folder)
         endpoint = '/jans-config-api/scim/scim-config'
         scopes = 'https://jans.io/scim/config.readonly https://jans.io/scim/config.write'
-        self._patch_objs(endpoint, scopes, objects_folder, False)
+        return self._import_config(endpoint, scopes, objects_folder)
+
+############################
+# snapshot
+#
+# exports attributes, scopes, clients, scripts, jans modules configuration and agama project configs
+# using the folder layout consumed by the import methods:
+#   attributes/<name>.json, scopes/<id>.json, clients/<inum>.json, script-objects/<inum>.json + <inum>.py,
+#   jans_auth_server/config.json, config_api/config.json, scim/config.json (JSON Patch replacing every property)
+#   agama/<projectName>/project.json (project metadata and configs, agama project code can not be exported:
+#   add the project code next to each project.json before importing it with import_agama_scripts)
+# collections and their pages are fetched in parallel, up to max_in_flight requests at a time.
+############################
+
+    def export_snapshot(self, output_folder, max_in_flight=8):
+        self.logger.debug('Exporting snapshot to {}', output_folder)
+        exports = {
+            'attributes': lambda: self._export_collection(output_folder, 'attributes', '/jans-config-api/api/v1/attributes', 'https://jans.io/oauth/config/attributes.readonly', 'name', max_in_flight),
+            'scopes': lambda: self._export_collection(output_folder, 'scopes', '/jans-config-api/api/v1/scopes', 'https://jans.io/oauth/config/scopes.readonly', 'id', max_in_flight),
+            'clients': lambda: self._export_collection(output_folder, 'clients', '/jans-config-api/api/v1/openid/clients', 'https://jans.io/oauth/config/openid/clients.readonly', 'inum', max_in_flight),
+            'script-objects': lambda: self._export_collection(output_folder, 'script-objects', '/jans-config-api/api/v1/config/scripts', 'https://jans.io/oauth/config/scripts.readonly', 'inum', max_in_flight),
+            'jans_auth_server': lambda: self._write_config_patch(output_folder, 'jans_auth_server', self.get_auth_server_config()),
+            'config_api': lambda: self._write_config_patch(output_folder, 'config_api', self.get_config_api_config()),
+            'scim': lambda: self._write_config_patch(output_folder, 'scim', self.get_scim_config()),
+            'agama': lambda: self._export_agama_projects(output_folder)
+        }
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            futures = {folder: executor.submit(export) for folder, export in exports.items()}
+            counts = {folder: future.result() for folder, future in futures.items()}
+        self.logger.debug('Snapshot exported to {}: {}', output_folder, counts)
+        return counts
+
+    def _export_collection(self, output_folder, folder, endpoint, scopes, key, max_in_flight):
+        return self._write_collection(output_folder, folder, key, self._list_all(endpoint, scopes, max_in_flight))
+
+    def _write_collection(self, output_folder, folder, key, entries):
+        folder_path = os.path.join(output_folder, folder)
+        os.makedirs(folder_path, exist_ok=True)
+        for entry in entries:
+            name = self._snapshot_file_name(entry.get(key))
+            if folder == 'script-objects':
+                with open(os.path.join(folder_path, '{}.py'.format(name)), 'w') as code_file:
+                    code_file.write(entry.pop('script', None) or '')
+            self._write_json(os.path.join(folder_path, '{}.json'.format(name)), entry)
+        return len(entries)
+
+    def _write_config_patch(self, output_folder, folder, config):
+        folder_path = os.path.join(output_folder, folder)
+        os.makedirs(folder_path, exist_ok=True)
+        patch_operations = [dict(op="replace", path='/{}'.format(self._escape_json_pointer(key)), value=value) for key, value in sorted(config.items())]
+        self._write_json(os.path.join(folder_path, 'config.json'), patch_operations)
+        return 1
+
+    def _export_agama_projects(self, output_folder):
+        endpoint = '/jans-config-api/api/v1/agama-deployment'
+        scopes = 'https://jans.io/oauth/config/agama.readonly'
+        agama_projects = {}
+        for deployment in self._list_all(endpoint, scopes, build_page_endpoint=self._build_agama_page_endpoint):
+            agama_project_name = self._get_agama_project_name(deployment)
+            configs = self._execute_with_json_response('GET', '{}/configs/{}'.format(endpoint, agama_project_name), scopes)
+            agama_projects[agama_project_name] = self._build_agama_project_json(agama_project_name, deployment, configs)
+        return self._write_agama_projects(output_folder, agama_projects)
+
+    def _build_agama_page_endpoint(self, endpoint, start_index):
+        return '{}?start={}&count={}'.format(endpoint, start_index, self.page_size)
+
+    def _get_agama_project_metadata(self, deployment):
+        return (deployment.get('details') or {}).get('projectMetadata') or {}
+
+    def _get_agama_project_name(self, deployment):
+        return self._get_agama_project_metadata(deployment).get('projectName') or deployment.get('id')
+
+    def _build_agama_project_json(self, agama_project_name, deployment, configs):
+        return dict(self._get_agama_project_metadata(deployment), projectName=agama_project_name, configs=configs or {})
+
+    def _write_agama_projects(self, output_folder, agama_projects):
+        for agama_project_name, project_json in agama_projects.items():
+            folder_path = os.path.join(output_folder, 'agama', self._snapshot_file_name(agama_project_name))
+            os.makedirs(folder_path, exist_ok=True)
+            self._write_json(os.path.join(folder_path, 'project.json'), project_json)
+        return len(agama_projects)
+
+    def _snapshot_file_name(self, name):
+        return re.sub(r'[^\w.=,-]', '_', str(name))
+
+    def _write_json(self, file_path, json_data):
+        with open(file_path, 'w') as json_file:
+            json.dump(json_data, json_file, indent=4, sort_keys=True, ensure_ascii=False)
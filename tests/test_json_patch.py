@@ -0,0 +1,145 @@
+# sherpa-py-janssen is available under the MIT License. https://github.com/Identicum/sherpa-py-janssen/
+# Copyright (c) 2026, Identicum - https://identicum.com/
+#
+
+import unittest
+from unittest import mock
+from sherpa.janssen.janssen_lib import ConfigAPIClient, RequestMetrics
+
+
+class JsonPatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = ConfigAPIClient.__new__(ConfigAPIClient)
+        self.client.logger = mock.Mock()
+        self.client.metrics = RequestMetrics(self.client.logger)
+
+    def diff(self, desired, current, remove_missing=False, ordered=False):
+        return self.client._diff_json('', desired, current, [], remove_missing, ordered)
+
+    def apply(self, json_data, patch_operations):
+        return self.client._apply_json_patch(json_data, patch_operations)
+
+    def assertPatched(self, desired, current, expected=None, remove_missing=False):
+        patched = self.apply(current, self.diff(desired, current, remove_missing))
+        self.assertEqual(patched, desired if expected is None else expected)
+
+    def test_no_changes(self):
+        current = {'a': 1, 'b': [1, 2], 'c': {'d': 'x'}}
+        self.assertEqual(self.diff({'a': 1, 'b': [1, 2], 'c': {'d': 'x'}}, current), [])
+
+    def test_extra_server_keys_kept(self):
+        self.assertPatched({'a': 2}, {'a': 1, 'description': 'x'}, expected={'a': 2, 'description': 'x'})
+
+    def test_extra_server_keys_removed(self):
+        self.assertPatched({'a': 2}, {'a': 1, 'description': 'x'}, remove_missing=True)
+
+    def test_reordered_scalars(self):
+        self.assertEqual(self.diff({'a': ['x', 'y']}, {'a': ['y', 'x']}), [])
+
+    def test_reordered_dict_items(self):
+        desired = {'a': [{'id': 2}, {'id': 1}]}
+        current = {'a': [{'id': 1, 'description': 'one'}, {'id': 2, 'description': 'two'}]}
+        self.assertEqual(self.diff(desired, current), [])
+
+    def test_dict_items_server_only_keys(self):
+        desired = {'configurationProperties': [{'value1': 'a', 'value2': 'x'}, {'value1': 'b', 'value2': 'y'}]}
+        current = {'configurationProperties': [{'value1': 'b', 'value2': 'y', 'hide': False}, {'value1': 'a', 'value2': 'x', 'hide': False}]}
+        self.assertEqual(self.diff(desired, current), [])
+        self.assertEqual(self.diff(desired, {'configurationProperties': current['configurationProperties'][::-1]}, ordered=True), [])
+        self.assertNotEqual(self.diff(desired, current, ordered=True), [])
+
+    def test_dict_items_extra_server_keys(self):
+        desired = {'a': [{'id': 1, 'name': 'x'}, {'id': 2, 'name': 'y'}]}
+        current = {'a': [{'id': 1, 'name': 'z', 'description': 'one'}, {'id': 2, 'name': 'y'}]}
+        self.assertPatched(desired, current)
+
+    def test_tail_add(self):
+        patch_operations = self.diff({'a': [1, 2, 3]}, {'a': [1, 2]})
+        self.assertEqual(patch_operations, [dict(op='add', path='/a/-', value=3)])
+        self.assertPatched({'a': [1, 2, 3]}, {'a': [1, 2]})
+
+    def test_tail_remove(self):
+        patch_operations = self.diff({'a': [1]}, {'a': [1, 2, 3]})
+        self.assertEqual(patch_operations, [dict(op='remove', path='/a/2'), dict(op='remove', path='/a/1')])
+        self.assertPatched({'a': [1]}, {'a': [1, 2, 3]})
+
+    def test_list_replaced(self):
+        self.assertPatched({'a': [3, 1]}, {'a': [1, 2]})
+
+    def test_bool_vs_int(self):
+        self.assertEqual(self.diff({'a': True}, {'a': 1}), [dict(op='replace', path='/a', value=True)])
+        self.assertEqual(self.diff({'a': 0}, {'a': False}), [dict(op='replace', path='/a', value=0)])
+        self.assertPatched({'a': [True]}, {'a': [1]})
+
+    def test_escaped_keys(self):
+        self.assertPatched({'a/b': {'c~d': 1}}, {'a/b': {'c~d': 0}})
+        self.assertEqual(self.diff({'a/b': 1}, {}), [dict(op='add', path='/a~1b', value=1)])
+
+    def test_ordered_reorder(self):
+        patch_operations = self.diff({'a': ['ES256', 'RS256']}, {'a': ['RS256', 'ES256']}, ordered=True)
+        self.assertEqual(patch_operations, [dict(op='replace', path='/a', value=['ES256', 'RS256'])])
+
+    def test_ordered_tail_add(self):
+        self.assertEqual(self.diff({'a': [1, 2, 3]}, {'a': [1, 2]}, ordered=True), [dict(op='add', path='/a/-', value=3)])
+        patch_operations = self.diff({'a': [2, 1, 3]}, {'a': [1, 2]}, ordered=True)
+        self.assertEqual(self.apply({'a': [1, 2]}, patch_operations), {'a': [2, 1, 3]})
+
+    def test_ordered_dict_items(self):
+        desired = {'a': [{'id': 2}, {'id': 1}]}
+        current = {'a': [{'id': 1}, {'id': 2}]}
+        self.assertEqual(self.apply(current, self.diff(desired, current, True, True)), desired)
+
+    def test_plan_config_patch_reorder(self):
+        current_config = {'keyAlgsAllowedForGeneration': ['RS256', 'ES256'], 'loggingLevel': 'INFO'}
+        patches = {'01-algs': [dict(op='replace', path='/keyAlgsAllowedForGeneration', value=['ES256', 'RS256'])]}
+        self.assertEqual(self.client._plan_config_patch(patches, current_config),
+                         [dict(op='replace', path='/keyAlgsAllowedForGeneration', value=['ES256', 'RS256'])])
+
+    def test_plan_config_patch_merged(self):
+        current_config = {'loggingLevel': 'INFO', 'sessionIdLifetime': 3600}
+        patches = {
+            '01-logging': [dict(op='replace', path='/loggingLevel', value='DEBUG')],
+            '02-logging': [dict(op='replace', path='/loggingLevel', value='INFO'), dict(op='remove', path='/sessionIdLifetime')]
+        }
+        self.assertEqual(self.client._plan_config_patch(patches, current_config), [dict(op='remove', path='/sessionIdLifetime')])
+
+    def test_apply_replace_missing_key_adds_it(self):
+        self.assertEqual(self.apply({}, [dict(op='replace', path='/a', value=1)]), {'a': 1})
+
+    def test_apply_remove_missing_key_ignored(self):
+        self.assertEqual(self.apply({'a': 1}, [dict(op='remove', path='/b')]), {'a': 1})
+
+    def test_apply_list_operations(self):
+        patch_operations = [
+            dict(op='add', path='/a/0', value=0),
+            dict(op='add', path='/a/-', value=3),
+            dict(op='remove', path='/a/1'),
+            dict(op='replace', path='/a/1', value=4)
+        ]
+        self.assertEqual(self.apply({'a': [1, 2]}, patch_operations), {'a': [0, 4, 3]})
+
+    def test_apply_move_copy_test(self):
+        patch_operations = [
+            dict(op='copy', path='/b', **{'from': '/a'}),
+            dict(op='move', path='/c', **{'from': '/a'}),
+            dict(op='test', path='/c', value=[1])
+        ]
+        self.assertEqual(self.apply({'a': [1]}, patch_operations), {'b': [1], 'c': [1]})
+
+    def test_apply_does_not_modify_input(self):
+        json_data = {'a': [1]}
+        self.apply(json_data, [dict(op='add', path='/a/-', value=2)])
+        self.assertEqual(json_data, {'a': [1]})
+
+    def test_apply_errors(self):
+        with self.assertRaises(ValueError):
+            self.apply({'a': [1]}, [dict(op='add', path='/a/5', value=2)])
+        with self.assertRaises(ValueError):
+            self.apply({'a': 1}, [dict(op='test', path='/a', value=2)])
+        with self.assertRaises(ValueError):
+            self.apply({}, {'op': 'add'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+# sherpa-py-janssen is available under the MIT License. https://github.com/Identicum/sherpa-py-janssen/
+# Copyright (c) 2026, Identicum - https://identicum.com/
+#
+
+import re
+import unittest
+from unittest import mock
+from sherpa.janssen.janssen_lib import ConfigAPIClient
+
+
+class RenderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = ConfigAPIClient.__new__(ConfigAPIClient)
+        self.client.logger = mock.Mock()
+        self.client.properties = {'idp_hostname': 'idp.example.com', 'empty': ''}
+        self.client.placeholder_pattern = re.compile(r'\$\{([^}]+)\}')
+
+    def test_defined_property(self):
+        self.assertEqual(self.client._render('https://${idp_hostname}/cb'), 'https://idp.example.com/cb')
+
+    def test_empty_property(self):
+        self.assertEqual(self.client._render('a${empty}b'), 'ab')
+
+    def test_undefined_property(self):
+        self.assertEqual(self.client._render('a${undefined}b'), 'a${undefined}b')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+# sherpa-py-janssen is available under the MIT License. https://github.com/Identicum/sherpa-py-janssen/
+# Copyright (c) 2026, Identicum - https://identicum.com/
+#
+
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from email.utils import formatdate
+from unittest import mock
+import requests
+from sherpa.janssen.janssen_lib import ConfigAPIClient
+from sherpa.janssen.async_janssen_lib import AsyncConfigAPIClient, aiohttp
+
+
+class Properties(dict):
+
+    def get(self, key):
+        return dict.get(self, key)
+
+
+class ClientTestMixin:
+
+    client_class = ConfigAPIClient
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        properties = Properties(
+            idp_hostname='idp.example.com',
+            configapi_client_id='client',
+            configapi_client_secret='secret',
+            configapi_backoff_factor=0,
+            configapi_max_backoff=30,
+            configapi_state_file=os.path.join(self.temp_dir.name, 'state.json')
+        )
+        with mock.patch('sherpa.janssen.janssen_lib.OIDCClient'), mock.patch('sherpa.janssen.janssen_lib.version', return_value='test'):
+            self.client = self.client_class(mock.Mock(), properties)
+        self.acc_tokens = iter('token{}'.format(n) for n in range(10))
+        self.client.token_cache.oidc_client.request_to_token_endpoint.side_effect = lambda b64_creds, params: {'access_token': next(self.acc_tokens), 'expires_in': 300}
+
+    def tearDown(self):
+        self.client.close()
+        self.temp_dir.cleanup()
+
+
+class RetriesTest(ClientTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.session.request = mock.Mock()
+
+    def response(self, status_code, headers=None):
+        return mock.Mock(status_code=status_code, headers=headers or {}, content=b'{}')
+
+    def execute(self, operation, *responses):
+        self.client.session.request.side_effect = [x if isinstance(x, Exception) else self.response(x) for x in responses]
+        body = None if operation == 'GET' else '{}'
+        return self.client._execute_with_retries(operation, '/endpoint', 'scope', 'https://idp.example.com/endpoint', 'application/json', body, False, self.client._new_request_stats())
+
+    def test_get_retried_on_502_504(self):
+        self.assertEqual(self.execute('GET', 502, 504, 200).status_code, 200)
+        self.assertEqual(self.client.session.request.call_count, 3)
+
+    def test_put_retried_on_read_timeout(self):
+        self.assertEqual(self.execute('PUT', requests.ReadTimeout(), 200).status_code, 200)
+        self.assertEqual(self.client.session.request.call_count, 2)
+
+    def test_post_patch_not_retried_on_502_504(self):
+        for operation in ('POST', 'PATCH'):
+            for status_code in (502, 504):
+                self.client.session.request.reset_mock()
+                self.assertEqual(self.execute(operation, status_code, 200).status_code, status_code)
+                self.assertEqual(self.client.session.request.call_count, 1)
+
+    def test_post_patch_retried_on_429_503(self):
+        for operation in ('POST', 'PATCH'):
+            self.client.session.request.reset_mock()
+            self.assertEqual(self.execute(operation, 429, 503, 200).status_code, 200)
+            self.assertEqual(self.client.session.request.call_count, 3)
+
+    def test_post_patch_not_retried_on_read_timeout(self):
+        for operation in ('POST', 'PATCH'):
+            self.client.session.request.reset_mock()
+            with self.assertRaises(requests.ReadTimeout):
+                self.execute(operation, requests.ReadTimeout(), 200)
+            self.assertEqual(self.client.session.request.call_count, 1)
+
+    def test_post_patch_retried_on_connect_timeout(self):
+        for operation in ('POST', 'PATCH'):
+            self.client.session.request.reset_mock()
+            self.assertEqual(self.execute(operation, requests.ConnectTimeout(), 200).status_code, 200)
+            self.assertEqual(self.client.session.request.call_count, 2)
+
+    def test_max_retries(self):
+        self.assertEqual(self.execute('GET', *[503] * 10).status_code, 503)
+        self.assertEqual(self.client.session.request.call_count, self.client.max_retries + 1)
+
+    def test_401_refreshes_token_once(self):
+        self.assertEqual(self.execute('GET', 401, 200).status_code, 200)
+        authorizations = [x.kwargs['headers']['Authorization'] for x in self.client.session.request.call_args_list]
+        self.assertEqual(authorizations, ['Bearer token0', 'Bearer token1'])
+        self.client.session.request.reset_mock()
+        self.assertEqual(self.execute('GET', 200).status_code, 200)
+        self.assertEqual(self.client.session.request.call_args.kwargs['headers']['Authorization'], 'Bearer token1')
+
+    def test_401_not_refreshed_twice(self):
+        self.assertEqual(self.execute('POST', 401, 401, 200).status_code, 401)
+        self.assertEqual(self.client.session.request.call_count, 2)
+
+    def test_retry_after_seconds(self):
+        self.assertEqual(self.client._get_retry_delay(0, self.response(503, {'Retry-After': '2'})), 2)
+
+    def test_retry_after_http_date(self):
+        delay = self.client._get_retry_delay(0, self.response(503, {'Retry-After': formatdate(time.time() + 10, usegmt=True)}))
+        self.assertTrue(8 <= delay <= 10, delay)
+        self.assertEqual(self.client._get_retry_delay(0, self.response(503, {'Retry-After': formatdate(time.time() - 10, usegmt=True)})), 0)
+
+    def test_retry_after_capped(self):
+        self.assertEqual(self.client._get_retry_delay(0, self.response(503, {'Retry-After': '120'})), 30)
+
+    def test_retry_after_invalid(self):
+        self.client.backoff_factor = 0.5
+        delay = self.client._get_retry_delay(2, self.response(503, {'Retry-After': 'soon'}))
+        self.assertTrue(0 <= delay <= 2, delay)
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AsyncRetriesTest(ClientTestMixin, unittest.TestCase):
+
+    client_class = AsyncConfigAPIClient
+
+    def setUp(self):
+        super().setUp()
+        self.client._send_request_async = mock.AsyncMock()
+
+    def execute(self, operation, *responses):
+        self.client._send_request_async.side_effect = [x if isinstance(x, Exception) else (mock.Mock(status=x, headers={}), b'{}') for x in responses]
+        body = None if operation == 'GET' else '{}'
+        response, content = asyncio.run(self.client._execute_with_retries_async(operation, '/endpoint', 'scope', 'https://idp.example.com/endpoint', 'application/json', body, False, self.client._new_request_stats()))
+        return response
+
+    def test_get_retried_on_502_504(self):
+        self.assertEqual(self.execute('GET', 502, 504, 200).status, 200)
+        self.assertEqual(self.client._send_request_async.call_count, 3)
+
+    def test_post_patch_retried_on_connect_timeout(self):
+        for operation in ('POST', 'PATCH'):
+            self.client._send_request_async.reset_mock()
+            self.assertEqual(self.execute(operation, aiohttp.ConnectionTimeoutError(), 200).status, 200)
+            self.assertEqual(self.client._send_request_async.call_count, 2)
+
+    def test_post_patch_not_retried_on_read_timeout(self):
+        for operation in ('POST', 'PATCH'):
+            self.client._send_request_async.reset_mock()
+            with self.assertRaises(aiohttp.SocketTimeoutError):
+                self.execute(operation, aiohttp.SocketTimeoutError(), 200)
+            self.assertEqual(self.client._send_request_async.call_count, 1)
+
+    def test_401_refreshes_token_once(self):
+        self.assertEqual(self.execute('GET', 401, 200).status, 200)
+        authorizations = [x.args[2]['Authorization'] for x in self.client._send_request_async.call_args_list]
+        self.assertEqual(authorizations, ['Bearer token0', 'Bearer token1'])
+
+
+if __name__ == '__main__':
+    unittest.main()